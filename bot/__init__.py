@@ -23,6 +23,8 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from pyrogram import utils as pyroutils
 
 from .core.config_manager import BinConfig
+from .core.task_index import TaskDict
+from .core.task_queue import TaskQueue
 from sabnzbdapi import SabnzbdClient
 
 getLogger("requests").setLevel(WARNING)
@@ -53,7 +55,14 @@ cpu_no = cpu_count()
 
 bot_cache = {}
 DOWNLOAD_DIR = "/usr/src/app/downloads/"
-intervals = {"status": {}, "qb": "", "jd": "", "nzb": "", "stopAll": False}
+intervals = {
+    "status": {},
+    "qb": "",
+    "jd": "",
+    "nzb": "",
+    "snapshot": "",
+    "stopAll": False,
+}
 qb_torrents = {}
 jd_downloads = {}
 nzb_jobs = {}
@@ -61,10 +70,10 @@ user_data = {}
 aria2_options = {}
 qbit_options = {}
 nzb_options = {}
-queued_dl = {}
-queued_up = {}
+queued_dl = TaskQueue()
+queued_up = TaskQueue()
 status_dict = {}
-task_dict = {}
+task_dict = TaskDict()
 rss_dict = {}
 shortener_dict = {}
 var_list = [
@@ -44,6 +44,7 @@ class Config:
     MEGA_EMAIL = ""
     MEGA_PASSWORD = ""
     DIRECT_LIMIT = 0
+    DIRECT_PARALLEL = 4
     MEGA_LIMIT = 0
     TORRENT_LIMIT = 0
     GD_DL_LIMIT = 0
@@ -66,9 +67,12 @@ class Config:
     LEECH_SUFFIX = ""
     LEECH_FONT = ""
     LEECH_SPLIT_SIZE = 2097152000
+    LEECH_PREFETCH = 2
+    LEECH_VIRTUAL_SPLIT = True
     MEDIA_GROUP = False
     HYBRID_LEECH = True
     HYPER_THREADS = 0
+    HYPER_SESSIONS = 4
     HYDRA_IP = ""
     HYDRA_API_KEY = ""
     NAME_SWAP = ""
@@ -76,6 +80,8 @@ class Config:
     QUEUE_ALL = 0
     QUEUE_DOWNLOAD = 0
     QUEUE_UPLOAD = 0
+    QUEUE_POLICY = "fair"
+    QUEUE_ADAPTIVE = False
     RCLONE_FLAGS = ""
     RCLONE_PATH = ""
     RCLONE_SERVE_URL = ""
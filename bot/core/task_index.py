@@ -0,0 +1,67 @@
+class TaskDict(dict):
+    # mid -> status dict that also keeps a gid -> mid index for O(1) lookups.
+    # Statuses that learn their gid later index it themselves via add_gid
+    def __init__(self):
+        super().__init__()
+        self._gids = {}
+        self._mid_gids = {}
+
+    def __setitem__(self, mid, task):
+        self._drop_gids(mid)
+        super().__setitem__(mid, task)
+        self._index(mid, task)
+
+    def __delitem__(self, mid):
+        super().__delitem__(mid)
+        self._drop_gids(mid)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def pop(self, mid, *args):
+        task = super().pop(mid, *args)
+        self._drop_gids(mid)
+        return task
+
+    def popitem(self):
+        mid, task = super().popitem()
+        self._drop_gids(mid)
+        return mid, task
+
+    def setdefault(self, mid, task=None):
+        if mid not in self:
+            self[mid] = task
+        return self[mid]
+
+    def update(self, *args, **kwargs):
+        for mid, task in dict(*args, **kwargs).items():
+            self[mid] = task
+
+    def clear(self):
+        super().clear()
+        self._gids.clear()
+        self._mid_gids.clear()
+
+    def _drop_gids(self, mid):
+        for gid in self._mid_gids.pop(mid, ()):
+            if self._gids.get(gid) == mid:
+                del self._gids[gid]
+
+    def _index(self, mid, task):
+        try:
+            gid = task.gid()
+        except Exception:
+            gid = None
+        if gid:
+            self.add_gid(gid, mid)
+
+    def add_gid(self, gid, mid):
+        if mid not in self:
+            return
+        self._gids[gid] = mid
+        self._mid_gids.setdefault(mid, set()).add(gid)
+
+    def get_by_gid(self, gid):
+        mid = self._gids.get(gid)
+        return None if mid is None else self.get(mid)
@@ -0,0 +1,129 @@
+from collections import deque
+from heapq import heappop, heappush
+from itertools import count
+
+from .config_manager import Config
+
+
+class TaskQueue(dict):
+    # mid -> start event. With the "fair" policy, queued tasks are handed out
+    # by priority class, then deficit round-robin between users (cost is
+    # the task size), then smallest task first for each user.
+    QUANTUM = 2 * 1024**3
+    MIN_COST = 512 * 1024**2
+    CLASSES = 3
+
+    def __init__(self):
+        super().__init__()
+        self._meta = {}
+        self._info = {}
+        self._heaps = {}
+        self._deficit = {}
+        self._credited = set()
+        self._selected = {}
+        self._rounds = [deque() for _ in range(self.CLASSES)]
+        self._seq = count()
+
+    def __setitem__(self, mid, event):
+        self.add(mid, event)
+
+    def add(self, mid, event, user_id=None, size=0, priority=None):
+        if mid in self:
+            self._meta.pop(mid, None)
+        self._selected.pop(mid, None)
+        super().__setitem__(mid, event)
+        priority = self.CLASSES - 1 if priority is None else priority
+        self._info[mid] = (user_id, size, priority)
+        key = (priority, user_id)
+        entry = (size or float("inf"), next(self._seq), mid)
+        self._meta[mid] = entry
+        if key not in self._heaps:
+            self._heaps[key] = []
+            self._deficit[key] = 0
+            self._rounds[priority].append(key)
+        heappush(self._heaps[key], entry)
+
+    def __delitem__(self, mid):
+        super().__delitem__(mid)
+        self._meta.pop(mid, None)
+        self._info.pop(mid, None)
+        self._selected.pop(mid, None)
+
+    def pop(self, mid, *args):
+        self._meta.pop(mid, None)
+        self._info.pop(mid, None)
+        self._selected.pop(mid, None)
+        return super().pop(mid, *args)
+
+    def clear(self):
+        super().clear()
+        self._meta.clear()
+        self._info.clear()
+        self._heaps.clear()
+        self._deficit.clear()
+        self._credited.clear()
+        self._selected.clear()
+        for rounds in self._rounds:
+            rounds.clear()
+
+    def _head(self, key):
+        heap = self._heaps[key]
+        while heap and self._meta.get(heap[0][2]) is not heap[0]:
+            heappop(heap)
+        return heap[0] if heap else None
+
+    def _drop_key(self, rounds, key):
+        rounds.popleft()
+        del self._heaps[key]
+        del self._deficit[key]
+        self._credited.discard(key)
+
+    def select(self):
+        if not self:
+            return None
+        if Config.QUEUE_POLICY != "fair":
+            return next(iter(self))
+        for rounds in self._rounds:
+            while rounds:
+                key = rounds[0]
+                if (head := self._head(key)) is None:
+                    self._drop_key(rounds, key)
+                    continue
+                if key not in self._credited:
+                    self._deficit[key] += self.QUANTUM
+                    self._credited.add(key)
+                size, _, mid = head
+                cost = min(max(size, self.MIN_COST), self.QUANTUM)
+                if self._deficit[key] >= cost:
+                    self._selected[mid] = (key, heappop(self._heaps[key]), cost)
+                    self._deficit[key] -= cost
+                    if not self._heaps[key]:
+                        self._drop_key(rounds, key)
+                    return mid
+                self._credited.discard(key)
+                rounds.rotate(-1)
+        # Every queued mid has a live heap entry until it is selected, and a
+        # selected mid leaves the queue or is requeued before the next call
+        return None
+
+    def size(self, mid):
+        return self._info.get(mid, (None, 0, None))[1]
+
+    def requeue(self, mid):
+        # Put back a selected task that could not be started after all, in
+        # its old place and with its cost refunded
+        if (selected := self._selected.pop(mid, None)) is None:
+            return
+        key, entry, cost = selected
+        if key not in self._heaps:
+            self._heaps[key] = []
+            self._deficit[key] = 0
+            self._rounds[key[0]].appendleft(key)
+        self._credited.add(key)
+        self._deficit[key] += cost
+        heappush(self._heaps[key], entry)
+
+    def ordered(self):
+        # Each selected mid has to leave the queue before the next one
+        while (mid := self.select()) is not None:
+            yield mid
@@ -1,8 +1,11 @@
-from pyrogram import Client, enums
-from asyncio import Lock, gather
+from pyrogram import Client, enums, raw
+from pyrogram.errors import AuthBytesInvalid
+from pyrogram.session import Auth, Session
+from asyncio import Lock, gather, sleep, wait_for
 from inspect import signature
+from time import time
 
-from .. import LOGGER
+from .. import LOGGER, bot_loop
 from .config_manager import Config
 
 
@@ -15,6 +18,14 @@ class TgClient:
     helper_bots = {}
     helper_loads = {}
 
+    # (client name, dc_id, slot) -> media session shared by HyperDL/HyperUL
+    MEDIA_IDLE_TIMEOUT = 600
+    MEDIA_HEALTH_INTERVAL = 60
+    _media_sessions = {}
+    _media_entries = {}
+    _media_locks = {}
+    _media_reaper = None
+
     BNAME = ""
     ID = 0
     IS_PREMIUM_USER = False
@@ -98,9 +109,146 @@ class TgClient:
                 cls.IS_PREMIUM_USER = False
                 cls.user = None
 
+    @classmethod
+    async def _create_media_session(cls, client, dc_id):
+        test_mode = await client.storage.test_mode()
+        if dc_id != await client.storage.dc_id():
+            media_session = Session(
+                client,
+                dc_id,
+                await Auth(client, dc_id, test_mode).create(),
+                test_mode,
+                is_media=True,
+            )
+            await media_session.start()
+
+            for _ in range(6):
+                exported_auth = await client.invoke(
+                    raw.functions.auth.ExportAuthorization(dc_id=dc_id)
+                )
+                try:
+                    await media_session.invoke(
+                        raw.functions.auth.ImportAuthorization(
+                            id=exported_auth.id, bytes=exported_auth.bytes
+                        )
+                    )
+                    break
+                except AuthBytesInvalid:
+                    await sleep(1)
+            else:
+                await media_session.stop()
+                raise AuthBytesInvalid
+        else:
+            media_session = Session(
+                client,
+                dc_id,
+                await client.storage.auth_key(),
+                test_mode,
+                is_media=True,
+            )
+            await media_session.start()
+        return media_session
+
+    @staticmethod
+    async def _stop_media_session(media_session):
+        try:
+            await media_session.stop()
+        except Exception as e:
+            LOGGER.error(f"Failed to stop media session. {e}")
+
+    @staticmethod
+    async def _is_healthy(media_session):
+        try:
+            await wait_for(
+                media_session.invoke(raw.functions.Ping(ping_id=0)), timeout=10
+            )
+            return True
+        except Exception:
+            return False
+
+    @classmethod
+    async def get_media_session(cls, client, dc_id, slot=0, max_retries=3):
+        # Users release the session object they got, so a session replaced
+        # while still in use keeps its own count until it can be stopped
+        key = (client.name, dc_id, slot)
+        lock = cls._media_locks.setdefault(key, Lock())
+        async with lock:
+            if entry := cls._media_sessions.get(key):
+                if time() - entry["checked"] < cls.MEDIA_HEALTH_INTERVAL or (
+                    await cls._is_healthy(entry["session"])
+                ):
+                    entry["checked"] = entry["used"] = time()
+                    entry["users"] += 1
+                    return entry["session"]
+                del cls._media_sessions[key]
+                entry["retired"] = True
+                if not entry["users"]:
+                    del cls._media_entries[id(entry["session"])]
+                    await cls._stop_media_session(entry["session"])
+
+            for attempt in range(max_retries):
+                try:
+                    media_session = await cls._create_media_session(client, dc_id)
+                    break
+                except Exception as e:
+                    LOGGER.error(f"Media session for DC {dc_id} failed: {e}")
+                    await sleep(attempt + 1)
+            else:
+                raise ValueError(
+                    f"Failed to create media session after {max_retries} attempts"
+                )
+
+            cls._media_sessions[key] = cls._media_entries[id(media_session)] = {
+                "session": media_session,
+                "users": 1,
+                "used": time(),
+                "checked": time(),
+                "retired": False,
+            }
+            if cls._media_reaper is None or cls._media_reaper.done():
+                cls._media_reaper = bot_loop.create_task(cls._reap_media_sessions())
+            return media_session
+
+    @classmethod
+    def release_media_session(cls, media_session, failed=False):
+        if (entry := cls._media_entries.get(id(media_session))) is None:
+            return
+        entry["users"] = max(entry["users"] - 1, 0)
+        entry["used"] = time()
+        if entry["retired"]:
+            if not entry["users"]:
+                del cls._media_entries[id(media_session)]
+                bot_loop.create_task(cls._stop_media_session(media_session))
+        elif failed:
+            entry["checked"] = 0
+
+    @classmethod
+    async def _reap_media_sessions(cls):
+        while cls._media_sessions:
+            await sleep(cls.MEDIA_HEALTH_INTERVAL)
+            for key, entry in list(cls._media_sessions.items()):
+                if (
+                    not entry["users"]
+                    and time() - entry["used"] > cls.MEDIA_IDLE_TIMEOUT
+                ):
+                    del cls._media_sessions[key]
+                    cls._media_entries.pop(id(entry["session"]), None)
+                    await cls._stop_media_session(entry["session"])
+
+    @classmethod
+    async def close_media_sessions(cls):
+        if cls._media_reaper and not cls._media_reaper.done():
+            cls._media_reaper.cancel()
+        sessions = [entry["session"] for entry in cls._media_entries.values()]
+        cls._media_sessions = {}
+        cls._media_entries = {}
+        cls._media_locks = {}
+        await gather(*(cls._stop_media_session(session) for session in sessions))
+
     @classmethod
     async def stop(cls):
         async with cls._lock:
+            await cls.close_media_sessions()
             if cls.bot:
                 await cls.bot.stop()
                 cls.bot = None
@@ -115,6 +263,7 @@ class TgClient:
     @classmethod
     async def reload(cls):
         async with cls._lock:
+            await cls.close_media_sessions()
             await cls.bot.restart()
             if cls.user:
                 await cls.user.restart()
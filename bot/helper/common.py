@@ -14,6 +14,7 @@ from .. import (
     DOWNLOAD_DIR,
     LOGGER,
     cpu_eater_lock,
+    cpu_no,
     excluded_extensions,
     intervals,
     multi_tags,
@@ -27,12 +28,11 @@ from .ext_utils.bot_utils import get_size_bytes, new_task, sync_to_async
 from .ext_utils.bulk_links import extract_bulk_links
 from .ext_utils.files_utils import (
     SevenZ,
+    get_archive_set,
     get_base_name,
     get_path_size,
     is_archive,
-    is_archive_split,
     is_first_archive_split,
-    split_file,
 )
 from .ext_utils.links_utils import (
     is_gdrive_id,
@@ -122,6 +122,7 @@ class TaskConfig:
         self.thumb = None
         self.excluded_extensions = []
         self.files_to_proceed = []
+        self.lazy_splits = {}
         self.is_super_chat = self.message.chat.type.name in ["SUPERGROUP", "CHANNEL"]
         self.source_url = None
         self.bot_pm = Config.BOT_PM or self.user_dict.get("BOT_PM")
@@ -628,35 +629,61 @@ class TaskConfig:
         LOGGER.info(f"Extracting: {self.name}")
         async with task_dict_lock:
             task_dict[self.mid] = SevenZStatus(self, sevenz, gid, "Extract")
+        # Sets extracting into the same directory run one after another, so
+        # members with the same name never race between 7z processes
+        targets = {}
         for dirpath, _, files in await sync_to_async(
             walk, self.up_dir or self.dir, topdown=False
         ):
-            code = 0
             for file_ in files:
-                if self.is_cancelled:
-                    return False
                 if (
                     is_first_archive_split(file_)
                     or is_archive(file_)
                     and not file_.strip().lower().endswith(".rar")
                 ):
-                    self.proceed_count += 1
                     f_path = ospath.join(dirpath, file_)
                     t_path = get_base_name(f_path) if self.is_file else dirpath
+                    targets.setdefault(t_path, []).append(
+                        (dirpath, file_, get_archive_set(file_, files))
+                    )
+        codes = []
+        pending = iter(targets.items())
+
+        async def extract_worker():
+            for t_path, jobs in pending:
+                for dirpath, file_, members in jobs:
+                    if self.is_cancelled:
+                        return
+                    self.proceed_count += 1
+                    f_path = ospath.join(dirpath, file_)
                     if not self.is_file:
                         self.subname = file_
                     code = await sevenz.extract(f_path, t_path, pswd)
-            if self.is_cancelled:
-                return code
-            if code == 0:
-                for file_ in files:
-                    if is_archive_split(file_) or is_archive(file_):
-                        del_path = ospath.join(dirpath, file_)
+                    codes.append(code)
+                    if self.is_cancelled or code != 0:
+                        continue
+                    # Free the disk as soon as each archive set is done
+                    for member in members:
                         try:
-                            await remove(del_path)
+                            await remove(ospath.join(dirpath, member))
+                        except FileNotFoundError:
+                            pass
                         except Exception:
                             self.is_cancelled = True
-        return t_path if self.is_file and code == 0 else dl_path
+
+        await gather(
+            *(
+                extract_worker()
+                for _ in range(
+                    min(len(targets), max(1, min(cpu_no // 2, SevenZ.MAX_JOBS)))
+                )
+            )
+        )
+        if self.is_cancelled:
+            return False
+        if self.is_file and codes == [0]:
+            return get_base_name(dl_path)
+        return dl_path
 
     async def proceed_ffmpeg(self, dl_path, gid):
         checked = False
@@ -971,10 +998,12 @@ class TaskConfig:
         )
         if data:
             sample_duration = int(data[0]) if data[0] else 60
-            part_duration = int(data[1]) if len(data) > 1 else 4
+            part_duration = int(data[1]) if len(data) > 1 and data[1] else 4
+            accurate = len(data) > 2 and data[2].strip().lower() == "exact"
         else:
             sample_duration = 60
             part_duration = 4
+            accurate = False
 
         self.files_to_proceed = {}
         if self.is_file and (await get_document_type(dl_path))[0]:
@@ -1002,7 +1031,7 @@ class TaskConfig:
                         self.subsize = await get_path_size(f_path)
                         self.subname = file_
                     res = await ffmpeg.sample_video(
-                        f_path, sample_duration, part_duration
+                        f_path, sample_duration, part_duration, accurate
                     )
                     if res and self.is_file:
                         new_folder = ospath.splitext(f_path)[0]
@@ -1066,8 +1095,9 @@ class TaskConfig:
                     self.progress = True
                     res = await ffmpeg.split(f_path, file_, parts, split_size)
                 else:
-                    self.progress = False
-                    res = await split_file(f_path, split_size, self)
+                    # Parts are cut by the uploader one ahead of the upload
+                    self.lazy_splits[f_path] = split_size
+                    continue
                 if self.is_cancelled:
                     return False
                 if res or f_size >= self.max_split_size:
@@ -1,10 +1,28 @@
 from aioshutil import rmtree as aiormtree, move
-from asyncio import create_subprocess_exec, sleep, wait_for
+from asyncio import Lock, create_subprocess_exec, sleep, wait_for
 from asyncio.subprocess import PIPE
 from contextlib import suppress
+from io import SEEK_CUR, SEEK_END, RawIOBase
 from psutil import disk_usage
-from os import path as ospath, readlink, walk
+from os import (
+    O_CREAT,
+    O_RDONLY,
+    O_TRUNC,
+    O_WRONLY,
+    close as osclose,
+    copy_file_range,
+    fstat,
+    open as osopen,
+    path as ospath,
+    pread,
+    readlink,
+    remove as osremove,
+    sendfile,
+    walk,
+    write as oswrite,
+)
 from re import I, escape, search as re_search, split as re_split
+from time import time
 
 from aiofiles.os import (
     listdir,
@@ -16,10 +34,12 @@ from aiofiles.os import (
     readlink as aioreadlink,
 )
 from magic import Magic
+from natsort import natsorted
 
 from ... import DOWNLOAD_DIR, LOGGER
+from ...core.config_manager import Config
 from ...core.torrent_manager import TorrentManager
-from .bot_utils import cmd_exec, sync_to_async
+from .bot_utils import sync_to_async
 from .exceptions import NotSupportedExtractionArchive
 
 ARCH_EXT = [
@@ -96,6 +116,10 @@ FIRST_SPLIT_REGEX = (
 
 SPLIT_REGEX = r"\.r\d+$|\.7z\.\d+$|\.z\d+$|\.zip\.\d+$|\.part\d+\.rar$"
 
+ARCHIVE_SET_REGEX = (
+    r"^(.+?)\.(?:(part)\d+\.rar|(7z)\.\d+|(zip)\.\d+|(zip|z\d+)|(rar|r\d+))$"
+)
+
 
 def is_first_archive_split(file):
     return bool(re_search(FIRST_SPLIT_REGEX, file.lower(), I))
@@ -109,6 +133,21 @@ def is_archive_split(file):
     return bool(re_search(SPLIT_REGEX, file.lower(), I))
 
 
+def _archive_set_key(file):
+    if match := re_search(ARCHIVE_SET_REGEX, file.lower(), I):
+        family = next(i for i, group in enumerate(match.groups()[1:]) if group)
+        return match[1], family
+    return file, None
+
+
+def get_archive_set(file, files):
+    # Volumes that belong to the same archive as file, itself included
+    key = _archive_set_key(file)
+    if key[1] is None:
+        return [file]
+    return [f for f in files if _archive_set_key(f) == key]
+
+
 async def clean_target(opath):
     if await aiopath.exists(opath):
         LOGGER.info(f"Cleaning Target: {opath}")
@@ -152,11 +191,125 @@ async def clean_unwanted(opath):
             await rmdir(dirpath)
 
 
-async def check_storage_threshold(size, threshold, io_task=False, alloc=False):
+async def check_storage_threshold(
+    size, threshold, io_task=False, alloc=False, mid=None
+):
+    await DiskLedger.refresh()
     free = (await sync_to_async(disk_usage, DOWNLOAD_DIR)).free
+    free -= DiskLedger.committed(mid)
     return free >= (threshold + (size * (2 if io_task else 1) if not alloc else 0))
 
 
+class DiskLedger:
+    # Bytes promised to running tasks that are not on disk yet. Each task
+    # holds one entry per pipeline stage, released as the stage frees space.
+    # Tasks are planned when checked and only count once they start, and the
+    # written bytes come from refresh() so nothing walks the disk under a lock
+    _entries = {}
+    _planned = {}
+    _written = {}
+    _started = set()
+    _lock = Lock()
+
+    @staticmethod
+    def stages(listener):
+        size = listener.size
+        stages = {"download": size}
+        if listener.extract:
+            stages["extract"] = size
+        if listener.compress:
+            stages["compress"] = size
+        elif (
+            listener.is_leech
+            and listener.split_size
+            and size > listener.split_size
+            and not (listener.as_doc and Config.LEECH_VIRTUAL_SPLIT)
+        ):
+            stages["split"] = size
+        return stages
+
+    @classmethod
+    async def refresh(cls):
+        for mid, (path, _) in list(cls._entries.items()):
+            written = await get_path_size(path) if await aiopath.exists(path) else 0
+            if mid in cls._entries:
+                cls._written[mid] = written
+
+    @staticmethod
+    def _outstanding(stages, written=0):
+        # Extraction replaces the archive it reads, so the download and the
+        # extract stage count once as the larger of the two
+        download = max(stages.get("download", 0) - written, 0)
+        rest = sum(
+            size
+            for stage, size in stages.items()
+            if stage not in ["download", "extract"]
+        )
+        return rest + max(download, stages.get("extract", 0))
+
+    @classmethod
+    def committed(cls, exclude=None):
+        return sum(
+            cls._outstanding(stages, cls._written.get(mid, 0))
+            for mid, (_, stages) in list(cls._entries.items())
+            if mid != exclude
+        )
+
+    @classmethod
+    async def has_room(cls, size=0, exclude=None):
+        free = (await sync_to_async(disk_usage, DOWNLOAD_DIR)).free
+        committed = cls.committed(exclude)
+        return free - committed >= size + Config.STORAGE_LIMIT * 1024**3
+
+    @classmethod
+    def need(cls, mid):
+        # What a planned task still has to write, for queue admission
+        if (entry := cls._planned.get(mid)) is None:
+            return 0
+        return cls._outstanding(entry[1], cls._written.get(mid, 0))
+
+    @classmethod
+    async def plan(cls, listener):
+        # Refuses only tasks that would not fit even with every other
+        # reservation released, the rest wait in the queue for their turn
+        stages = cls.stages(listener)
+        written = 0
+        if await aiopath.exists(listener.dir):
+            written = min(await get_path_size(listener.dir), stages["download"])
+        free = (await sync_to_async(disk_usage, DOWNLOAD_DIR)).free
+        free += cls.committed(listener.mid)
+        if free < cls._outstanding(stages, written) + Config.STORAGE_LIMIT * 1024**3:
+            return False
+        cls._written[listener.mid] = written
+        if listener.mid in cls._started:
+            cls._entries[listener.mid] = (listener.dir, stages)
+        else:
+            cls._planned[listener.mid] = (listener.dir, stages)
+        return True
+
+    @classmethod
+    async def reserve(cls, mid):
+        # The room check and the reservation are one step, so tasks started
+        # together can not overcommit the disk. False keeps the task queued
+        async with cls._lock:
+            if mid in cls._planned and not await cls.has_room(cls.need(mid), mid):
+                return False
+            cls._started.add(mid)
+            if entry := cls._planned.pop(mid, None):
+                cls._entries[mid] = entry
+            return True
+
+    @classmethod
+    def release(cls, mid, stage=None):
+        if stage is None:
+            cls._entries.pop(mid, None)
+            cls._planned.pop(mid, None)
+            cls._written.pop(mid, None)
+            cls._started.discard(mid)
+        elif entry := cls._entries.get(mid):
+            entry[1].pop(stage, None)
+
+
 async def get_path_size(opath):
     total_size = 0
     if await aiopath.isfile(opath):
@@ -243,8 +396,174 @@ async def move_and_merge(source, destination, mid):
             await move(src_path, dest_path)
 
 
-async def join_files(opath):
-    files = await listdir(opath)
+COPY_CHUNK = 64 * 1024 * 1024
+
+
+def copy_range(src, dst, offset, count, listener=None, on_copy=None):
+    # copy_file_range keeps the data in the kernel (and reflinks where the
+    # filesystem can), sendfile and plain pread/write cover the rest
+    end = offset + count
+    mode = 0
+    while offset < end:
+        if listener is not None and listener.is_cancelled:
+            return False
+        size = min(COPY_CHUNK, end - offset)
+        try:
+            if mode == 0:
+                done = copy_file_range(src, dst, size, offset)
+            elif mode == 1:
+                done = sendfile(dst, src, offset, size)
+            else:
+                done = oswrite(dst, pread(src, size, offset))
+        except OSError:
+            if mode == 2:
+                raise
+            mode += 1
+            continue
+        if done == 0:
+            break
+        offset += done
+        if on_copy is not None:
+            on_copy(done)
+    return offset >= end
+
+
+class FileSlice(RawIOBase):
+    # Read-only window over part of a file, so split parts can be uploaded
+    # straight from the source without being written out
+    def __init__(self, path, offset=0, size=None, name=None):
+        super().__init__()
+        self._fd = osopen(path, O_RDONLY)
+        self._pos = 0
+        self.path = path
+        self.offset = offset
+        self.size = max(fstat(self._fd).st_size - offset, 0)
+        if size is not None:
+            self.size = min(self.size, size)
+        self.name = name or ospath.basename(path)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=0):
+        if whence == SEEK_CUR:
+            pos += self._pos
+        elif whence == SEEK_END:
+            pos += self.size
+        self._pos = min(max(pos, 0), self.size)
+        return self._pos
+
+    def pread(self, size, pos):
+        size = min(size, self.size - pos)
+        return pread(self._fd, size, self.offset + pos) if size > 0 else b""
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self._pos
+        data = self.pread(size, self._pos)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            osclose(self._fd)
+        super().close()
+
+
+class FileSplitter:
+    def __init__(self, listener):
+        self._listener = listener
+        self._processed_bytes = 0
+        self._start_time = time()
+
+    @property
+    def processed_bytes(self):
+        return self._processed_bytes
+
+    @property
+    def speed_raw(self):
+        return self._processed_bytes / max(time() - self._start_time, 1)
+
+    @property
+    def progress_raw(self):
+        total = self._listener.subsize or self._listener.size
+        return min(self._processed_bytes / total * 100, 100) if total else 0
+
+    @property
+    def eta_raw(self):
+        total = self._listener.subsize or self._listener.size
+        if not (speed := self.speed_raw):
+            return 0
+        return max(total - self._processed_bytes, 0) / speed
+
+    def clear(self):
+        self._start_time = time()
+        self._processed_bytes = 0
+
+    def _on_copy(self, size):
+        self._processed_bytes += size
+
+    def _cut(self, f_path, index, split_size):
+        part = f"{f_path}.{index:03}"
+        offset = (index - 1) * split_size
+        src = osopen(f_path, O_RDONLY)
+        try:
+            count = min(split_size, fstat(src).st_size - offset)
+            dst = osopen(part, O_WRONLY | O_CREAT | O_TRUNC, 0o644)
+            try:
+                done = copy_range(
+                    src, dst, offset, count, self._listener, self._on_copy
+                )
+            finally:
+                osclose(dst)
+        finally:
+            osclose(src)
+        if not done:
+            osremove(part)
+            return None
+        return part
+
+    async def cut(self, f_path, index, split_size):
+        return await sync_to_async(self._cut, f_path, index, split_size)
+
+    def _join(self, parts, dest):
+        dst = osopen(dest, O_WRONLY | O_CREAT | O_TRUNC, 0o644)
+        try:
+            for part in parts:
+                src = osopen(part, O_RDONLY)
+                try:
+                    if not copy_range(
+                        src,
+                        dst,
+                        0,
+                        fstat(src).st_size,
+                        self._listener,
+                        self._on_copy,
+                    ):
+                        return False
+                finally:
+                    osclose(src)
+        finally:
+            osclose(dst)
+        return True
+
+    async def join(self, parts, dest):
+        return await sync_to_async(self._join, parts, dest)
+
+
+async def join_files(opath, splitter):
+    files = natsorted(await listdir(opath))
     results = []
     exists = False
     for file_ in files:
@@ -254,10 +573,17 @@ async def join_files(opath):
             exists = True
             final_name = file_.rsplit(".", 1)[0]
             fpath = f"{opath}/{final_name}"
-            cmd = f'cat "{fpath}."* > "{fpath}"'
-            _, stderr, code = await cmd_exec(cmd, True)
-            if code != 0:
-                LOGGER.error(f"Failed to join {final_name}, stderr: {stderr}")
+            parts = [
+                f"{opath}/{part}"
+                for part in files
+                if re_search(rf"^{escape(final_name)}\.\d+$", part)
+            ]
+            try:
+                joined = await splitter.join(parts, fpath)
+            except Exception as e:
+                LOGGER.error(f"Failed to join {final_name}, error: {e}")
+                joined = False
+            if not joined:
                 if await aiopath.isfile(fpath):
                     await remove(fpath)
             else:
@@ -273,72 +599,76 @@ async def join_files(opath):
                     await remove(f"{opath}/{file_}")
 
 
-async def split_file(f_path, split_size, listener):
-    out_path = f"{f_path}."
-    if listener.is_cancelled:
-        return False
-    listener.subproc = await create_subprocess_exec(
-        "split",
-        "--numeric-suffixes=1",
-        "--suffix-length=3",
-        f"--bytes={split_size}",
-        f_path,
-        out_path,
-        stderr=PIPE,
-    )
-    _, stderr = await listener.subproc.communicate()
-    code = listener.subproc.returncode
-    if listener.is_cancelled:
-        return False
-    if code == -9:
-        listener.is_cancelled = True
-        return False
-    elif code != 0:
-        try:
-            stderr = stderr.decode().strip()
-        except Exception:
-            stderr = "Unable to decode the error!"
-        LOGGER.error(f"{stderr}. Split Document: {f_path}")
-    return True
-
-
 class SevenZ:
+    # Several extractions can run at once, progress is summed over the jobs
+    MAX_JOBS = 4
+
     def __init__(self, listener):
         self._listener = listener
-        self._processed_bytes = 0
-        self._percentage = "0%"
+        self._jobs = {}
+        self._finished_size = 0
+        self._finished_bytes = 0
+
+    @property
+    def procs(self):
+        return list(self._jobs)
 
     @property
     def processed_bytes(self):
-        return self._processed_bytes
+        return self._finished_bytes + sum(done for _, done in self._jobs.values())
+
+    @property
+    def total_size(self):
+        return self._finished_size + sum(size for size, _ in self._jobs.values())
 
     @property
     def progress(self):
-        return self._percentage
+        total = self.total_size
+        return f"{int(self.processed_bytes / total * 100)}%" if total else "0%"
 
-    async def _sevenz_progress(self):
+    def _update_subsize(self):
+        self._listener.subsize = self.total_size
+
+    async def _run(self, cmd):
+        self._listener.subproc = proc = await create_subprocess_exec(
+            *cmd, stdout=PIPE, stderr=PIPE
+        )
+        self._jobs[proc] = [0, 0]
+        try:
+            await self._sevenz_progress(proc)
+            _, stderr = await proc.communicate()
+        finally:
+            size, done = self._jobs.pop(proc)
+            self._finished_size += size
+            self._finished_bytes += size if proc.returncode == 0 else done
+            self._update_subsize()
+        return proc.returncode, stderr
+
+    async def _sevenz_progress(self, proc):
+        job = self._jobs[proc]
         pattern = r"(\d+)\s+bytes|Total Physical Size\s*=\s*(\d+)"
         while not (
-            self._listener.subproc.returncode is not None
+            proc.returncode is not None
             or self._listener.is_cancelled
-            or self._listener.subproc.stdout.at_eof()
+            or proc.stdout.at_eof()
         ):
             try:
-                line = await wait_for(self._listener.subproc.stdout.readline(), 2)
+                line = await wait_for(proc.stdout.readline(), 2)
             except Exception:
                 break
             line = line.decode().strip()
             if match := re_search(pattern, line):
-                self._listener.subsize = int(match[1] or match[2])
+                job[0] = int(match[1] or match[2])
+                self._update_subsize()
             await sleep(0.05)
         s = b""
         while not (
             self._listener.is_cancelled
-            or self._listener.subproc.returncode is not None
-            or self._listener.subproc.stdout.at_eof()
+            or proc.returncode is not None
+            or proc.stdout.at_eof()
         ):
             try:
-                char = await wait_for(self._listener.subproc.stdout.read(1), 60)
+                char = await wait_for(proc.stdout.read(1), 60)
             except Exception:
                 break
             if not char:
@@ -346,19 +676,14 @@ class SevenZ:
             s += char
             if char == b"%":
                 try:
-                    self._percentage = s.decode().rsplit(" ", 1)[-1].strip()
-                    self._processed_bytes = (
-                        int(self._percentage.strip("%")) / 100
-                    ) * self._listener.subsize
+                    job[1] = (
+                        int(s.decode().rsplit(" ", 1)[-1].strip().strip("%")) / 100
+                    ) * job[0]
                 except Exception:
-                    self._processed_bytes = 0
-                    self._percentage = "0%"
+                    job[1] = 0
                 s = b""
             await sleep(0.05)
 
-        self._processed_bytes = 0
-        self._percentage = "0%"
-
     async def extract(self, f_path, t_path, pswd):
         cmd = [
             "7z",
@@ -376,14 +701,7 @@ class SevenZ:
             del cmd[2]
         if self._listener.is_cancelled:
             return False
-        self._listener.subproc = await create_subprocess_exec(
-            *cmd,
-            stdout=PIPE,
-            stderr=PIPE,
-        )
-        await self._sevenz_progress()
-        _, stderr = await self._listener.subproc.communicate()
-        code = self._listener.subproc.returncode
+        code, stderr = await self._run(cmd)
         if self._listener.is_cancelled:
             return False
         if code == -9:
@@ -427,12 +745,7 @@ class SevenZ:
             LOGGER.info(f"Zip: orig_path: {dl_path}, zip_path: {up_path}")
         if self._listener.is_cancelled:
             return False
-        self._listener.subproc = await create_subprocess_exec(
-            *cmd, stdout=PIPE, stderr=PIPE
-        )
-        await self._sevenz_progress()
-        _, stderr = await self._listener.subproc.communicate()
-        code = self._listener.subproc.returncode
+        code, stderr = await self._run(cmd)
         if self._listener.is_cancelled:
             return False
         if code == -9:
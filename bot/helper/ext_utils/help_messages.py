@@ -157,7 +157,8 @@ sample_video = """<b>Sample Video</b>: -sv
 
 Create sample video for one video or folder of videos.
 /cmd -sv (it will take the default values which 60sec sample duration and part duration is 4sec).
-You can control those values. Example: /cmd -sv 70:5(sample-duration:part-duration) or /cmd -sv :5 or /cmd -sv 70."""
+You can control those values. Example: /cmd -sv 70:5(sample-duration:part-duration) or /cmd -sv :5 or /cmd -sv 70.
+Parts are cut at keyframes without re-encoding. Add exact to re-encode for frame-accurate cuts. Example: /cmd -sv 70:5:exact"""
 
 screenshot = """<b>ScreenShots</b>: -ss
 
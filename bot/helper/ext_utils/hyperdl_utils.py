@@ -7,30 +7,188 @@ from asyncio import (
     TimeoutError as AsyncTimeoutError,
     Event,
 )
+from collections import deque
 from datetime import datetime
-from math import ceil, floor
+from math import ceil
 from mimetypes import guess_extension
-from os import path as ospath
+from os import (
+    O_CREAT,
+    O_RDWR,
+    close as osclose,
+    fstat,
+    ftruncate,
+    listdir,
+    open as osopen,
+    path as ospath,
+    posix_fallocate,
+    pread,
+    pwrite,
+    remove as osremove,
+)
 from pathlib import Path
 from re import sub
 from sys import argv
 from time import time
 
-from aiofiles import open as aiopen
 from aiofiles.os import makedirs, remove
 from aioshutil import move
 from pyrogram import StopTransmission, raw, utils
-from pyrogram.errors import AuthBytesInvalid, FloodWait
+from pyrogram.errors import FloodWait
 from pyrogram.file_id import PHOTO_TYPES, FileId, FileType, ThumbnailSource
-from pyrogram.session import Auth, Session
 from pyrogram.session.internals import MsgId
 
-from ... import LOGGER
+from ... import DOWNLOAD_DIR, LOGGER
 from ...core.config_manager import Config
 from ...core.tg_client import TgClient
+from .bot_utils import sync_to_async
+
+
+class RangeJournal:
+    # One byte per chunk persisted next to the .temp file, so a later task for
+    # the same file only fetches the chunks that never reached the disk
+    def __init__(self, path, key, size, chunk_size):
+        self.path = path
+        self.size = size
+        self.chunk_size = chunk_size
+        self.header = f"{key}:{size}:{chunk_size}\n".encode()
+        self.done = bytearray(ceil(size / chunk_size))
+        self._fd = None
+
+    def open(self, resume):
+        self._fd = osopen(self.path, O_RDWR | O_CREAT, 0o644)
+        total = len(self.header) + len(self.done)
+        if resume and fstat(self._fd).st_size == total:
+            data = pread(self._fd, total, 0)
+            if data.startswith(self.header):
+                self.done[:] = data[len(self.header) :]
+                return self
+        self.done[:] = bytes(len(self.done))
+        ftruncate(self._fd, 0)
+        pwrite(self._fd, self.header + self.done, 0)
+        return self
+
+    def mark(self, index):
+        self.done[index] = 1
+        pwrite(self._fd, b"\x01", len(self.header) + index)
+
+    def missing(self):
+        return [index for index, done in enumerate(self.done) if not done]
+
+    def completed_bytes(self):
+        completed = self.done.count(1) * self.chunk_size
+        if self.done and self.done[-1]:
+            completed -= len(self.done) * self.chunk_size - self.size
+        return completed
+
+    def close(self):
+        if self._fd is not None:
+            osclose(self._fd)
+            self._fd = None
+
+
+class ChunkScheduler:
+    # Helper bots pull chunks from one queue, a FloodWaited bot is parked and
+    # a stalled chunk is fetched again by an idle bot that isn't much slower.
+    # Once every bot is parked for long the FloodWait goes to the caller
+    STEAL_AFTER = 10
+    STEAL_FACTOR = 3
+    MAX_ATTEMPTS = 5
+    FLOOD_HANDOFF = 60
+
+    def __init__(self, chunks, clients=()):
+        self.clients = set(clients)
+        self.floods = {}
+        self.pending = deque(chunks)
+        self.in_flight = {}
+        self.attempts = {}
+        self.failures = {}
+        self.rates = {}
+        self.parked = {}
+        self.chunk_time = 0
+        self.error = None
+
+    def take(self, client):
+        now = time()
+        if self.pending:
+            chunk = self.pending.popleft()
+            self.in_flight[chunk] = [now, client, 1]
+            return chunk
+        threshold = max(self.STEAL_AFTER, self.STEAL_FACTOR * self.chunk_time)
+        rate = self.rates.get(client, 0)
+        stalled = [
+            (started, chunk)
+            for chunk, (started, owner, holders) in self.in_flight.items()
+            if holders == 1
+            and owner != client
+            and now - started > threshold
+            and rate * 2 >= self.rates.get(owner, 0)
+        ]
+        if not stalled:
+            return None
+        chunk = min(stalled)[1]
+        self.in_flight[chunk][2] += 1
+        return chunk
+
+    def complete(self, chunk, client, elapsed, size):
+        self.failures[client] = 0
+        rate = size / max(elapsed, 0.001)
+        self.rates[client] = (
+            0.7 * self.rates[client] + 0.3 * rate if client in self.rates else rate
+        )
+        self.chunk_time = (
+            0.8 * self.chunk_time + 0.2 * elapsed if self.chunk_time else elapsed
+        )
+        return self.in_flight.pop(chunk, None) is not None
+
+    def retry(self, chunk, client, error):
+        self.failures[client] = self.failures.get(client, 0) + 1
+        if not (flight := self.in_flight.get(chunk)):
+            return
+        flight[2] -= 1
+        if flight[2]:
+            return
+        del self.in_flight[chunk]
+        self.attempts[chunk] = self.attempts.get(chunk, 0) + 1
+        if self.attempts[chunk] >= self.MAX_ATTEMPTS:
+            self.error = error
+        else:
+            self.pending.appendleft(chunk)
+
+    def give_back(self, chunk):
+        # A rate limit is no failure, the chunk just goes back to the front
+        if not (flight := self.in_flight.get(chunk)):
+            return
+        flight[2] -= 1
+        if not flight[2]:
+            del self.in_flight[chunk]
+            self.pending.appendleft(chunk)
+
+    def park(self, client, error):
+        self.parked[client] = time() + error.value + 1
+        self.floods[client] = error
+        active = [c for c in self.clients if not self.retired(c)]
+        if active and all(self.parked_for(c) for c in active):
+            flood = min((self.floods[c] for c in active), key=lambda e: e.value)
+            if flood.value >= self.FLOOD_HANDOFF:
+                self.error = flood
+
+    def parked_for(self, client):
+        return max(0, self.parked.get(client, 0) - time())
+
+    def retired(self, client):
+        return self.failures.get(client, 0) >= self.MAX_ATTEMPTS
+
+    def finished(self):
+        return not self.pending and not self.in_flight
 
 
 class HyperTGDownload:
+    # Partials live outside DOWNLOAD_DIR, which clean_all wipes at boot, and
+    # are named by file_unique_id so any later task for the file resumes them
+    PARTIAL_DIR = ospath.join(ospath.dirname(DOWNLOAD_DIR.rstrip("/")), "hyperdl")
+    PARTIAL_TTL = 86400
+    _partials = set()
+
     def __init__(self):
         self.clients = TgClient.helper_bots
         self.work_loads = TgClient.helper_loads
@@ -47,8 +205,9 @@ class HyperTGDownload:
         self.chunk_size = 1024 * 1024
         self.file_name = ""
         self._cancel_event = Event()
-        self.session_pool = {}
-        create_task(self._clean_cache())
+        self._fd = None
+        self._journal = None
+        self._file_key = ""
 
     @staticmethod
     async def get_media_type(message):
@@ -107,79 +266,6 @@ class HyperTGDownload:
             self.cache_last_access[index] = time()
         return self.cache_file_ref[index]
 
-    async def _clean_cache(self):
-        while True:
-            await sleep(15 * 60)
-            current_time = time()
-            expired_keys = [
-                k
-                for k, v in self.cache_last_access.items()
-                if current_time - v > 45 * 60
-            ]
-
-            for key in expired_keys:
-                if key in self.cache_file_ref:
-                    del self.cache_file_ref[key]
-                if key in self.cache_last_access:
-                    del self.cache_last_access[key]
-
-    async def generate_media_session(self, client, file_id, index, max_retries=3):
-        session_key = (index, file_id.dc_id)
-
-        if session_key in self.session_pool:
-            return self.session_pool[session_key]
-
-        retries = 0
-        while retries < max_retries:
-            try:
-                if file_id.dc_id != await client.storage.dc_id():
-                    media_session = Session(
-                        client,
-                        file_id.dc_id,
-                        await Auth(
-                            client, file_id.dc_id, await client.storage.test_mode()
-                        ).create(),
-                        await client.storage.test_mode(),
-                        is_media=True,
-                    )
-                    await media_session.start()
-
-                    for _ in range(6):
-                        exported_auth = await client.invoke(
-                            raw.functions.auth.ExportAuthorization(dc_id=file_id.dc_id)
-                        )
-
-                        try:
-                            await media_session.invoke(
-                                raw.functions.auth.ImportAuthorization(
-                                    id=exported_auth.id, bytes=exported_auth.bytes
-                                )
-                            )
-                            break
-                        except AuthBytesInvalid:
-                            await sleep(1)
-                    else:
-                        await media_session.stop()
-                        raise AuthBytesInvalid
-                else:
-                    media_session = Session(
-                        client,
-                        file_id.dc_id,
-                        await client.storage.auth_key(),
-                        await client.storage.test_mode(),
-                        is_media=True,
-                    )
-                    await media_session.start()
-
-                self.session_pool[session_key] = media_session
-                return media_session
-
-            except Exception:
-                retries += 1
-                await sleep(1)
-
-        raise ValueError(f"Failed to create media session after {max_retries} attempts")
-
     @staticmethod
     async def get_location(file_id: FileId):
         file_type = file_id.file_type
@@ -219,92 +305,70 @@ class HyperTGDownload:
                 thumb_size=file_id.thumbnail_size,
             )
 
-    async def get_file(
-        self,
-        offset_bytes: int,
-        first_part_cut: int,
-        last_part_cut: int,
-        part_count: int,
-        max_retries=5,
-    ):
-        index = min(self.work_loads, key=self.work_loads.get)
+    async def _worker(self, index, scheduler):
         client = self.clients[index]
+        media_session = location = dc_id = None
 
         self.work_loads[index] += 1
-        current_retry = 0
-
         try:
-            while current_retry < max_retries:
+            while scheduler.error is None and not scheduler.retired(index):
+                if self._cancel_event.is_set():
+                    raise CancelledError("Download cancelled")
+                if wait := scheduler.parked_for(index):
+                    await sleep(min(wait, 1))
+                    continue
+                if (chunk_index := scheduler.take(index)) is None:
+                    if scheduler.finished():
+                        return
+                    await sleep(0.5)
+                    continue
+
+                started = time()
                 try:
-                    if self._cancel_event.is_set():
-                        raise CancelledError("Download cancelled")
-
-                    file_id = await self.get_file_id(client, index)
-                    media_session, location = await gather(
-                        self.generate_media_session(client, file_id, index),
-                        self.get_location(file_id),
-                    )
-
-                    current_part = 1
-                    current_offset = offset_bytes
-
-                    while current_part <= part_count:
-                        if self._cancel_event.is_set():
-                            raise CancelledError("Download cancelled")
-
-                        try:
-                            r = await wait_for(
-                                media_session.invoke(
-                                    raw.functions.upload.GetFile(
-                                        location=location,
-                                        offset=current_offset,
-                                        limit=self.chunk_size,
-                                    ),
-                                ),
-                                timeout=30,
-                            )
-
-                            if isinstance(r, raw.types.upload.File):
-                                chunk = r.bytes
-
-                                if not chunk:
-                                    break
-
-                                if part_count == 1:
-                                    yield chunk[first_part_cut:last_part_cut]
-                                elif current_part == 1:
-                                    yield chunk[first_part_cut:]
-                                elif current_part == part_count:
-                                    yield chunk[:last_part_cut]
-                                else:
-                                    yield chunk
-
-                                current_part += 1
-                                current_offset += self.chunk_size
-                                self._processed_bytes += len(chunk)
-                            else:
-                                raise ValueError(f"Unexpected response: {r}")
-
-                        except (FloodWait, AsyncTimeoutError, ConnectionError) as e:
-                            if isinstance(e, FloodWait):
-                                await sleep(e.value + 1)
-                            else:
-                                await sleep(1)
-                            continue
-
-                    if current_part <= part_count:
-                        raise ValueError(
-                            f"Incomplete download: got {current_part - 1} of {part_count} parts"
+                    if media_session is None:
+                        file_id = await self.get_file_id(client, index)
+                        dc_id = file_id.dc_id
+                        media_session, location = await gather(
+                            TgClient.get_media_session(client, dc_id),
+                            self.get_location(file_id),
                         )
-                    break
-
-                except (AsyncTimeoutError, ConnectionError, AttributeError):
-                    current_retry += 1
-                    if current_retry >= max_retries:
-                        raise
-                    await sleep(current_retry * 2)
-
+                    r = await wait_for(
+                        media_session.invoke(
+                            raw.functions.upload.GetFile(
+                                location=location,
+                                offset=chunk_index * self.chunk_size,
+                                limit=self.chunk_size,
+                            ),
+                        ),
+                        timeout=30,
+                    )
+                    if not isinstance(r, raw.types.upload.File) or not r.bytes:
+                        raise ValueError(f"Unexpected response: {r}")
+                except FloodWait as e:
+                    scheduler.park(index, e)
+                    scheduler.give_back(chunk_index)
+                    continue
+                except (
+                    AsyncTimeoutError,
+                    ConnectionError,
+                    AttributeError,
+                    ValueError,
+                ) as e:
+                    if media_session is not None:
+                        TgClient.release_media_session(media_session, True)
+                        media_session = None
+                    scheduler.retry(chunk_index, index, e)
+                    await sleep(1)
+                    continue
+
+                if scheduler.complete(
+                    chunk_index, index, time() - started, len(r.bytes)
+                ):
+                    await sync_to_async(self._store, chunk_index, r.bytes)
+                    self._processed_bytes += len(r.bytes)
         finally:
+            if media_session is not None:
+                TgClient.release_media_session(media_session)
             self.work_loads[index] -= 1
 
     async def progress_callback(self, progress, progress_args):
@@ -323,102 +387,125 @@ class HyperTGDownload:
             except Exception:
                 await sleep(1)
 
-    async def single_part(self, start, end, part_index, max_retries=3):
-        until_bytes, from_bytes = min(end, self.file_size - 1), start
-
-        offset = from_bytes - (from_bytes % self.chunk_size)
-        first_part_cut = from_bytes - offset
-        last_part_cut = until_bytes % self.chunk_size + 1
-
-        part_count = ceil(until_bytes / self.chunk_size) - floor(
-            offset / self.chunk_size
-        )
-        part_file_path = ospath.join(
-            self.directory, f"{self.file_name}.temp.{part_index:02d}"
-        )
-
-        for attempt in range(max_retries):
+    @staticmethod
+    def _preallocate(fd, size):
+        if fstat(fd).st_size > size:
+            ftruncate(fd, size)
+        if not size:
+            return
+        try:
+            posix_fallocate(fd, 0, size)
+        except OSError:
+            ftruncate(fd, size)
+
+    def _store(self, chunk_index, data):
+        view = memoryview(data)
+        offset = chunk_index * self.chunk_size
+        while view:
+            written = pwrite(self._fd, view, offset)
+            view = view[written:]
+            offset += written
+        self._journal.mark(chunk_index)
+
+    @classmethod
+    def _prune_partials(cls):
+        now = time()
+        for name in listdir(cls.PARTIAL_DIR):
+            if name.split(".", 1)[0] in cls._partials:
+                continue
+            path = ospath.join(cls.PARTIAL_DIR, name)
             try:
-                async with aiopen(part_file_path, "wb") as f:
-                    async for chunk in self.get_file(
-                        offset, first_part_cut, last_part_cut, part_count
-                    ):
-                        if self._cancel_event.is_set():
-                            raise CancelledError("Download cancelled")
-                        await f.write(chunk)
-                return part_index, part_file_path
-            except (AsyncTimeoutError, ConnectionError):
-                if attempt == max_retries - 1:
-                    raise
-                await sleep((attempt + 1) * 2)
-                self._processed_bytes = 0
+                if now - ospath.getmtime(path) > cls.PARTIAL_TTL:
+                    osremove(path)
+            except OSError:
+                pass
 
     async def handle_download(self, progress, progress_args):
         self._cancel_event.clear()
 
         await makedirs(self.directory, exist_ok=True)
-        temp_file_path = (
-            ospath.abspath(
-                sub("\\\\", "/", ospath.join(self.directory, self.file_name))
-            )
-            + ".temp"
+        await makedirs(self.PARTIAL_DIR, exist_ok=True)
+        await sync_to_async(self._prune_partials)
+        file_path = ospath.abspath(
+            sub("\\\\", "/", ospath.join(self.directory, self.file_name))
         )
-
-        num_parts = min(self.num_parts, max(1, self.file_size // (10 * 1024 * 1024)))
-
-        if self.file_size < 10 * 1024 * 1024:
-            num_parts = 1
-
-        part_size = self.file_size // num_parts if num_parts > 0 else self.file_size
-        ranges = [
-            (i * part_size, min((i + 1) * part_size - 1, self.file_size - 1))
-            for i in range(num_parts)
-        ]
+        # The same file in two tasks at once gets a throwaway partial
+        partial = self._file_key
+        if partial in self._partials:
+            partial = f"{partial}_{MsgId()}"
+        self._partials.add(partial)
+        temp_file_path = ospath.join(self.PARTIAL_DIR, f"{partial}.temp")
+        journal_path = f"{temp_file_path}.journal"
 
         tasks = []
         prog_task = None
+        completed = False
+        cancelled = False
 
         try:
-            for i, (start, end) in enumerate(ranges):
-                tasks.append(create_task(self.single_part(start, end, i)))
+            resume = ospath.exists(temp_file_path) and (
+                ospath.getsize(temp_file_path) == self.file_size
+            )
+            self._journal = await sync_to_async(
+                RangeJournal(
+                    journal_path, self._file_key, self.file_size, self.chunk_size
+                ).open,
+                resume,
+            )
+            self._processed_bytes = self._journal.completed_bytes()
+            if self._processed_bytes:
+                LOGGER.info(
+                    f"HyperDL: Resuming {self.file_name} from {self._processed_bytes} bytes"
+                )
+            self._fd = osopen(temp_file_path, O_RDWR | O_CREAT, 0o644)
+            await sync_to_async(self._preallocate, self._fd, self.file_size)
 
             if progress:
                 prog_task = create_task(self.progress_callback(progress, progress_args))
 
-            results = await gather(*tasks)
-
-            async with aiopen(temp_file_path, "wb") as temp_file:
-                for _, part_file_path in sorted(results, key=lambda x: x[0]):
-                    try:
-                        async with aiopen(part_file_path, "rb") as part_file:
-                            while True:
-                                chunk = await part_file.read(8 * 1024 * 1024)
-                                if not chunk:
-                                    break
-                                await temp_file.write(chunk)
-                        await remove(part_file_path)
-                    except Exception as e:
-                        LOGGER.error(
-                            f"Error processing part file {part_file_path}: {e}"
-                        )
-                        raise
+            if missing := self._journal.missing():
+                indexes = sorted(self.clients, key=self.work_loads.get)
+                workers = [
+                    indexes[i % len(indexes)]
+                    for i in range(min(self.num_parts, len(missing)))
+                ]
+                scheduler = ChunkScheduler(missing, workers)
+                tasks = [
+                    create_task(self._worker(index, scheduler)) for index in workers
+                ]
+                await gather(*tasks)
+                if scheduler.error is not None:
+                    raise scheduler.error
+                if self._cancel_event.is_set():
+                    raise CancelledError("Download cancelled")
+
+            if missing := self._journal.missing():
+                raise ValueError(
+                    f"Incomplete download: {len(missing)} chunks missing, all helper bots failed"
+                )
 
             if prog_task and not prog_task.done():
                 prog_task.cancel()
 
-            file_path = ospath.splitext(temp_file_path)[0]
+            osclose(self._fd)
+            self._fd = None
+            self._journal.close()
+            await remove(journal_path)
             await move(temp_file_path, file_path)
+            completed = True
 
             return file_path
 
         except FloodWait as fw:
             raise fw
         except (CancelledError, StopTransmission):
+            cancelled = True
             return None
         except Exception as e:
             LOGGER.error(f"HyperDL Error: {e}")
             return None
         finally:
+            self._partials.discard(partial)
             self._cancel_event.set()
             if prog_task and not prog_task.done():
                 prog_task.cancel()
@@ -427,15 +514,19 @@ class HyperTGDownload:
                 if not task.done():
                     task.cancel()
 
-            for i in range(len(ranges)):
-                part_path = ospath.join(
-                    self.directory, f"{self.file_name}.temp.{i:02d}"
-                )
-                try:
-                    if ospath.exists(part_path):
-                        await remove(part_path)
-                except Exception:
-                    pass
+            if self._fd is not None:
+                osclose(self._fd)
+                self._fd = None
+            if self._journal:
+                self._journal.close()
+
+            if cancelled and not completed:
+                for path in (temp_file_path, journal_path):
+                    try:
+                        if ospath.exists(path):
+                            await remove(path)
+                    except Exception:
+                        pass
 
     @staticmethod
     async def get_extension(file_type, mime_type):
@@ -483,6 +574,9 @@ class HyperTGDownload:
 
             file_id_str = media if isinstance(media, str) else media.file_id
             file_id_obj = FileId.decode(file_id_str)
+            self._file_key = getattr(media, "file_unique_id", "") or (
+                f"{file_id_obj.media_id}"
+            )
 
             file_type = file_id_obj.file_type
             media_file_name = getattr(media, "file_name", "")
@@ -0,0 +1,203 @@
+from asyncio import create_task, gather, sleep, wait_for
+from math import ceil
+
+from pyrogram import StopTransmission, raw, types, utils
+from pyrogram.errors import FilePartMissing, FloodWait
+
+from ...core.config_manager import Config
+from ...core.tg_client import TgClient
+from .bot_utils import sync_to_async
+from .files_utils import FileSlice
+
+
+class HyperTGUpload:
+    # Uploaded parts belong to the account that saved them, so the parallelism
+    # comes from several pooled media sessions of the sending client
+    PART_SIZE = 512 * 1024
+    MIN_SIZE = 10 * 1024 * 1024
+    SESSIONS = 4
+
+    def __init__(self, client, listener, progress=None):
+        self.client = client
+        self.listener = listener
+        self.progress = progress
+        self.num_workers = Config.HYPER_THREADS or 8
+        self.sessions = max(1, int(Config.HYPER_SESSIONS or self.SESSIONS))
+        self.file_size = 0
+        self._uploaded = 0
+        self._dc_id = None
+        self._source = None
+        self.sent = False
+
+    @classmethod
+    def supports(cls, size):
+        return size > cls.MIN_SIZE
+
+    async def _save_part(self, session, file_id, part, total_parts, max_retries=5):
+        chunk = await sync_to_async(
+            self._source.pread, self.PART_SIZE, part * self.PART_SIZE
+        )
+        for attempt in range(max_retries):
+            if self.listener.is_cancelled:
+                raise StopTransmission
+            try:
+                await wait_for(
+                    session.invoke(
+                        raw.functions.upload.SaveBigFilePart(
+                            file_id=file_id,
+                            file_part=part,
+                            file_total_parts=total_parts,
+                            bytes=chunk,
+                        )
+                    ),
+                    timeout=60,
+                )
+                return len(chunk)
+            except FloodWait as e:
+                await sleep(e.value + 1)
+            except (TimeoutError, ConnectionError):
+                if attempt == max_retries - 1:
+                    raise
+                await sleep(attempt + 1)
+        raise ValueError(f"Part {part} failed after {max_retries} attempts")
+
+    async def _worker(self, slot, file_id, parts, total_parts):
+        session = await TgClient.get_media_session(self.client, self._dc_id, slot)
+        failed = True
+        try:
+            for part in parts:
+                self._uploaded += await self._save_part(
+                    session, file_id, part, total_parts
+                )
+                if self.progress:
+                    await self.progress(self._uploaded, self.file_size)
+            failed = False
+        finally:
+            TgClient.release_media_session(session, failed)
+
+    def _open(self, path):
+        # Plain paths get a whole-file slice, virtual parts come as slices
+        if isinstance(path, FileSlice):
+            self._source = path
+            return False
+        self._source = FileSlice(path)
+        return True
+
+    def _close(self, owned):
+        if owned:
+            self._source.close()
+        self._source = None
+
+    async def save_file(self, path):
+        owned = self._open(path)
+        self.file_size = self._source.size
+        total_parts = ceil(self.file_size / self.PART_SIZE)
+        file_id = self.client.rnd_id()
+        self._dc_id = await self.client.storage.dc_id()
+        name = self._source.name
+        parts = iter(range(total_parts))
+        tasks = [
+            create_task(self._worker(i % self.sessions, file_id, parts, total_parts))
+            for i in range(min(self.num_workers, total_parts))
+        ]
+        try:
+            await gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            self._close(owned)
+        return raw.types.InputFileBig(id=file_id, parts=total_parts, name=name)
+
+    async def _save_missing_part(self, path, file_id, part, total_parts):
+        owned = self._open(path)
+        session = await TgClient.get_media_session(self.client, self._dc_id)
+        try:
+            await self._save_part(session, file_id, part, total_parts)
+        finally:
+            TgClient.release_media_session(session)
+            self._close(owned)
+
+    async def send_media(
+        self,
+        reply_to,
+        path,
+        caption,
+        thumb=None,
+        kind="document",
+        duration=0,
+        width=0,
+        height=0,
+        performer=None,
+        title=None,
+    ):
+        file = await self.save_file(path)
+        attributes = [raw.types.DocumentAttributeFilename(file_name=file.name)]
+        if kind == "video":
+            attributes.insert(
+                0,
+                raw.types.DocumentAttributeVideo(
+                    supports_streaming=True, duration=duration, w=width, h=height
+                ),
+            )
+        elif kind == "audio":
+            attributes.insert(
+                0,
+                raw.types.DocumentAttributeAudio(
+                    duration=duration, performer=performer, title=title
+                ),
+            )
+        media = raw.types.InputMediaUploadedDocument(
+            mime_type=self.client.guess_mime_type(file.name)
+            or ("video/mp4" if kind == "video" else "application/zip"),
+            file=file,
+            thumb=await self.client.save_file(thumb) if thumb else None,
+            force_file=kind == "document" or None,
+            attributes=attributes,
+        )
+
+        for _ in range(3):
+            try:
+                r = await self.client.invoke(
+                    raw.functions.messages.SendMedia(
+                        peer=await self.client.resolve_peer(reply_to.chat.id),
+                        media=media,
+                        silent=True,
+                        reply_to=await utils.get_reply_to(
+                            self.client,
+                            chat_id=reply_to.chat.id,
+                            reply_to_message_id=reply_to.id,
+                        ),
+                        random_id=self.client.rnd_id(),
+                        **await utils.parse_text_entities(
+                            self.client, caption, None, None
+                        ),
+                    )
+                )
+            except FilePartMissing as e:
+                await self._save_missing_part(path, file.id, e.value, file.parts)
+                continue
+            self.sent = True
+            return await self._sent_message(reply_to, r)
+        raise ValueError("Telegram kept reporting missing file parts")
+
+    async def _sent_message(self, reply_to, r):
+        # Past this point the media is in the chat, so errors must not
+        # lead to a second upload
+        msg_id = None
+        for update in r.updates:
+            if isinstance(
+                update,
+                (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage),
+            ):
+                return await types.Message._parse(
+                    self.client,
+                    update.message,
+                    {user.id: user for user in r.users},
+                    {chat.id: chat for chat in r.chats},
+                )
+            if isinstance(update, raw.types.UpdateMessageID):
+                msg_id = update.id
+        if msg_id is None:
+            raise ValueError("Telegram did not return the sent message")
+        return await self.client.get_messages(reply_to.chat.id, msg_id)
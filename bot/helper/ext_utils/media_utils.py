@@ -1,33 +1,90 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
 from PIL import Image
-from hashlib import md5
-from aiofiles.os import remove, path as aiopath, makedirs
+from hashlib import new as new_hash
+from aiofiles import open as aiopen
+from aiofiles.os import remove, path as aiopath, makedirs, stat as aiostat
 from asyncio import (
     create_subprocess_exec,
-    gather,
+    create_task,
+    shield,
     wait_for,
     sleep,
 )
-from asyncio.subprocess import PIPE
-from os import path as ospath
-from re import search as re_search, escape
+from asyncio.subprocess import DEVNULL, PIPE
+from os import path as ospath, stat
+from orjson import loads as json_loads
+from re import search as re_search
+from threading import Lock
 from time import time
+from zlib import crc32
 from aioshutil import rmtree
 from langcodes import Language
 
-from ... import LOGGER, cpu_no, DOWNLOAD_DIR
+from ... import LOGGER, bot_loop, cpu_no, DOWNLOAD_DIR
 from ...core.config_manager import BinConfig
 from .bot_utils import cmd_exec, sync_to_async
 from .files_utils import get_mime_type, is_archive, is_archive_split
 from .status_utils import time_to_seconds
 
 
+HASH_BUFFER = 8 * 1024 * 1024
+HASH_CACHE_SIZE = 512
+HASH_POOL = ThreadPoolExecutor(max_workers=max(2, cpu_no // 2))
+_hash_cache = OrderedDict()
+_hash_lock = Lock()
+
+
+class Crc32:
+    def __init__(self):
+        self._value = 0
+
+    def update(self, data):
+        self._value = crc32(data, self._value)
+
+    def hexdigest(self):
+        return f"{self._value:08x}"
+
+
+def get_file_hashes(path, algorithms=("md5",), offset=0, length=None):
+    # Every missing digest is computed in one read pass and cached per
+    # (device, inode, size, mtime) so an unchanged file is never read twice
+    st = stat(path)
+    key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, offset, length)
+    with _hash_lock:
+        cached = dict(_hash_cache.get(key, {}))
+    if missing := [algo for algo in algorithms if algo not in cached]:
+        digests = {
+            algo: Crc32() if algo == "crc32" else new_hash(algo) for algo in missing
+        }
+        buffer = bytearray(HASH_BUFFER)
+        view = memoryview(buffer)
+        left = st.st_size - offset if length is None else length
+        with open(path, "rb", buffering=0) as f:
+            f.seek(offset)
+            while left > 0 and (size := f.readinto(view[: min(left, HASH_BUFFER)])):
+                left -= size
+                for digest in digests.values():
+                    digest.update(view[:size])
+        for algo, digest in digests.items():
+            cached[algo] = digest.hexdigest()
+        with _hash_lock:
+            _hash_cache[key] = cached
+            _hash_cache.move_to_end(key)
+            while len(_hash_cache) > HASH_CACHE_SIZE:
+                _hash_cache.popitem(last=False)
+    return {algo: cached[algo] for algo in algorithms}
+
+
+async def hash_file(path, *algorithms, offset=0, length=None):
+    return await bot_loop.run_in_executor(
+        HASH_POOL, get_file_hashes, path, algorithms or ("md5",), offset, length
+    )
+
+
 def get_md5_hash(up_path):
-    md5_hash = md5()
-    with open(up_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            md5_hash.update(byte_block)
-        return md5_hash.hexdigest()
+    return get_file_hashes(up_path)["md5"]
 
 
 async def create_thumb(msg, _id=""):
@@ -44,34 +101,102 @@ async def create_thumb(msg, _id=""):
     return output
 
 
+PROBE_CACHE_SIZE = 256
+PROBE_ENTRIES = (
+    "format=duration,size,bit_rate,start_time"
+    ":format_tags=artist,ARTIST,Artist,title,TITLE,Title"
+    ":stream=index,codec_type,codec_name,width,height,duration"
+    ":stream_tags=language"
+)
+_probe_cache = OrderedDict()
+_probe_keys = {}
+_probe_pending = {}
+
+
+class MediaProbe:
+    # Only the ffprobe entries in PROBE_ENTRIES are present
+    def __init__(self, data):
+        self.format = data.get("format")
+        self.streams = data.get("streams")
+
+    @property
+    def duration(self):
+        return float((self.format or {}).get("duration", 0) or 0)
+
+    @property
+    def start_time(self):
+        return float((self.format or {}).get("start_time", 0) or 0)
+
+    @property
+    def tags(self):
+        return (self.format or {}).get("tags", {})
+
+
+async def _run_probe(path):
+    result = await cmd_exec(
+        [
+            "ffprobe",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-print_format",
+            "json",
+            "-show_entries",
+            PROBE_ENTRIES,
+            path,
+        ]
+    )
+    ffresult = None
+    if result[0] and result[2] == 0:
+        try:
+            ffresult = MediaProbe(json_loads(result[0]))
+        except ValueError as e:
+            LOGGER.error(f"ffprobe returned invalid json for {path}: {e}")
+    return ffresult, result[1]
+
+
+async def probe_media(path):
+    # One ffprobe per (path, size, mtime), a rewritten file gets a new key
+    st = await aiostat(path)
+    path = ospath.abspath(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    if key in _probe_cache:
+        _probe_cache.move_to_end(key)
+        return _probe_cache[key]
+    if (task := _probe_pending.get(key)) is None:
+        task = _probe_pending[key] = create_task(_run_probe(path))
+        task.add_done_callback(lambda _: _probe_pending.pop(key, None))
+    result = await shield(task)
+    if (old_key := _probe_keys.get(path)) and old_key != key:
+        _probe_cache.pop(old_key, None)
+    _probe_keys[path] = key
+    _probe_cache[key] = result
+    while len(_probe_cache) > PROBE_CACHE_SIZE:
+        old_key, _ = _probe_cache.popitem(last=False)
+        if _probe_keys.get(old_key[0]) == old_key:
+            del _probe_keys[old_key[0]]
+    return result
+
+
+def drop_probe(path):
+    if key := _probe_keys.pop(ospath.abspath(path), None):
+        _probe_cache.pop(key, None)
+
+
 async def get_media_info(path, extra_info=False):
     try:
-        result = await cmd_exec(
-            [
-                "ffprobe",
-                "-hide_banner",
-                "-loglevel",
-                "error",
-                "-print_format",
-                "json",
-                "-show_format",
-                "-show_streams",
-                path,
-            ]
-        )
+        ffresult, stderr = await probe_media(path)
     except Exception as e:
         LOGGER.error(f"Get Media Info: {e}. Mostly File not found! - File: {path}")
         return (0, "", "", "") if extra_info else (0, None, None)
-    if result[0] and result[2] == 0:
-        ffresult = eval(result[0])
-        fields = ffresult.get("format")
-        if fields is None:
-            LOGGER.error(f"get_media_info: {result}")
+    if ffresult is not None:
+        if ffresult.format is None:
+            LOGGER.error(f"get_media_info: {stderr}")
             return (0, "", "", "") if extra_info else (0, None, None)
-        duration = round(float(fields.get("duration", 0)))
+        duration = round(ffresult.duration)
         if extra_info:
             lang, qual, stitles = "", "", ""
-            if (streams := ffresult.get("streams")) and streams[0].get(
+            if (streams := ffresult.streams) and streams[0].get(
                 "codec_type"
             ) == "video":
                 qual = int(streams[0].get("height"))
@@ -92,7 +217,7 @@ async def get_media_info(path, extra_info=False):
                         if st not in stitles:
                             stitles += f"{st}, "
             return duration, qual, lang[:-2], stitles[:-2]
-        tags = fields.get("tags", {})
+        tags = ffresult.tags
         artist = tags.get("artist") or tags.get("ARTIST") or tags.get("Artist")
         title = tags.get("title") or tags.get("TITLE") or tags.get("Title")
         return duration, artist, title
@@ -111,19 +236,8 @@ async def get_document_type(path):
     if mime_type.startswith("image"):
         return False, False, True
     try:
-        result = await cmd_exec(
-            [
-                "ffprobe",
-                "-hide_banner",
-                "-loglevel",
-                "error",
-                "-print_format",
-                "json",
-                "-show_streams",
-                path,
-            ]
-        )
-        if result[1] and mime_type.startswith("video"):
+        ffresult, stderr = await probe_media(path)
+        if stderr and mime_type.startswith("video"):
             is_video = True
     except Exception as e:
         LOGGER.error(f"Get Document Type: {e}. Mostly File not found! - File: {path}")
@@ -134,10 +248,10 @@ async def get_document_type(path):
         if mime_type.startswith("video"):
             is_video = True
         return is_video, is_audio, is_image
-    if result[0] and result[2] == 0:
-        fields = eval(result[0]).get("streams")
+    if ffresult is not None:
+        fields = ffresult.streams
         if fields is None:
-            LOGGER.error(f"get_document_type: {result}")
+            LOGGER.error(f"get_document_type: {stderr}")
             return is_video, is_audio, is_image
         is_video = False
         for stream in fields:
@@ -150,6 +264,69 @@ async def get_document_type(path):
     return is_video, is_audio, is_image
 
 
+async def _extract_frames(video_file, ss_nb, duration, ss_dir=None, layout=None):
+    # One process seeks every input to its nearest keyframe and writes the
+    # screenshots and/or the tiled grid from the same decoded frames
+    interval = duration // (ss_nb + 1)
+    cmd = [BinConfig.FFMPEG_NAME, "-hide_banner", "-loglevel", "error"]
+    for i in range(ss_nb):
+        cmd.extend(["-noaccurate_seek", "-ss", f"{interval * (i + 1)}"])
+        cmd.extend(["-i", video_file])
+    filters = [
+        f"[{i}:v]trim=end_frame=1,setpts=PTS-STARTPTS,format=yuvj420p[f{i}]"
+        for i in range(ss_nb)
+    ]
+    frames = "".join(f"[f{i}]" for i in range(ss_nb)) + f"concat=n={ss_nb}:v=1:a=0"
+    if ss_dir and layout:
+        filters.extend([f"{frames},split=2[ss][grid]", f"[grid]tile={layout}[tile]"])
+    elif ss_dir:
+        filters.append(f"{frames}[ss]")
+    else:
+        filters.append(f"{frames},tile={layout}[tile]")
+    cmd.extend(
+        [
+            "-filter_complex",
+            ";".join(filters),
+            "-threads",
+            f"{max(1, cpu_no // 2)}",
+        ]
+    )
+    output = None
+    if ss_dir:
+        name = ospath.splitext(ospath.basename(video_file))[0].replace("%", "%%")
+        cmd.extend(
+            [
+                "-map",
+                "[ss]",
+                "-fps_mode",
+                "passthrough",
+                "-q:v",
+                "2",
+                "-start_number",
+                "0",
+                f"{ss_dir.replace('%', '%%')}/SS.{name}_%02d.jpg",
+            ]
+        )
+    if layout:
+        output_dir = f"{DOWNLOAD_DIR}thumbnails"
+        await makedirs(output_dir, exist_ok=True)
+        output = ospath.join(output_dir, f"{time()}.jpg")
+        cmd.extend(["-map", "[tile]", "-frames:v", "1", "-q:v", "2", output])
+    try:
+        _, err, code = await wait_for(cmd_exec(cmd), timeout=60)
+        if code != 0 or (output and not await aiopath.exists(output)):
+            LOGGER.error(
+                f"Error while extracting frames from video. Path: {video_file}. stderr: {err}"
+            )
+            return False, None
+    except Exception:
+        LOGGER.error(
+            f"Error while extracting frames from video. Path: {video_file}. Error: Timeout some issues with ffmpeg with specific arch!"
+        )
+        return False, None
+    return True, output
+
+
 async def take_ss(video_file, ss_nb) -> bool:
     duration = (await get_media_info(video_file))[0]
     if duration != 0:
@@ -157,42 +334,8 @@ async def take_ss(video_file, ss_nb) -> bool:
         name, _ = ospath.splitext(name)
         dirpath = f"{dirpath}/{name}_mltbss"
         await makedirs(dirpath, exist_ok=True)
-        interval = duration // (ss_nb + 1)
-        cap_time = interval
-        cmds = []
-        for i in range(ss_nb):
-            output = f"{dirpath}/SS.{name}_{i:02}.png"
-            cmd = [
-                BinConfig.FFMPEG_NAME,
-                "-hide_banner",
-                "-loglevel",
-                "error",
-                "-ss",
-                f"{cap_time}",
-                "-i",
-                video_file,
-                "-q:v",
-                "1",
-                "-frames:v",
-                "1",
-                "-threads",
-                f"{max(1, cpu_no // 2)}",
-                output,
-            ]
-            cap_time += interval
-            cmds.append(cmd_exec(cmd))
-        try:
-            resutls = await wait_for(gather(*cmds), timeout=60)
-            if resutls[0][2] != 0:
-                LOGGER.error(
-                    f"Error while creating sreenshots from video. Path: {video_file}. stderr: {resutls[0][1]}"
-                )
-                await rmtree(dirpath, ignore_errors=True)
-                return False
-        except Exception:
-            LOGGER.error(
-                f"Error while creating sreenshots from video. Path: {video_file}. Error: Timeout some issues with ffmpeg with specific arch!"
-            )
+        done, _ = await _extract_frames(video_file, ss_nb, duration, dirpath)
+        if not done:
             await rmtree(dirpath, ignore_errors=True)
             return False
         return dirpath
@@ -281,51 +424,79 @@ async def get_video_thumbnail(video_file, duration):
 async def get_multiple_frames_thumbnail(video_file, layout, keep_screenshots):
     ss_nb = layout.split("x")
     ss_nb = int(ss_nb[0]) * int(ss_nb[1])
-    dirpath = await take_ss(video_file, ss_nb)
-    if not dirpath:
-        return None
-    output_dir = f"{DOWNLOAD_DIR}thumbnails"
-    await makedirs(output_dir, exist_ok=True)
-    output = ospath.join(output_dir, f"{time()}.jpg")
-    cmd = [
-        BinConfig.FFMPEG_NAME,
-        "-hide_banner",
-        "-loglevel",
-        "error",
-        "-pattern_type",
-        "glob",
-        "-i",
-        f"{escape(dirpath)}/*.png",
-        "-vf",
-        f"tile={layout}, thumbnail",
-        "-q:v",
-        "1",
-        "-frames:v",
-        "1",
-        "-f",
-        "mjpeg",
-        "-threads",
-        f"{max(1, cpu_no // 2)}",
-        output,
-    ]
-    try:
-        _, err, code = await wait_for(cmd_exec(cmd), timeout=60)
-        if code != 0 or not await aiopath.exists(output):
-            LOGGER.error(
-                f"Error while combining thumbnails for video. Name: {video_file} stderr: {err}"
-            )
-            return None
-    except Exception:
-        LOGGER.error(
-            f"Error while combining thumbnails from video. Name: {video_file}. Error: Timeout some issues with ffmpeg with specific arch!"
-        )
+    duration = (await get_media_info(video_file))[0]
+    if duration == 0:
+        LOGGER.error("get_multiple_frames_thumbnail: Can't get the duration of video")
         return None
-    finally:
-        if not keep_screenshots:
+    dirpath = None
+    if keep_screenshots:
+        dirpath, name = video_file.rsplit("/", 1)
+        dirpath = f"{dirpath}/{ospath.splitext(name)[0]}_mltbss"
+        await makedirs(dirpath, exist_ok=True)
+    done, output = await _extract_frames(video_file, ss_nb, duration, dirpath, layout)
+    if not done:
+        if dirpath:
             await rmtree(dirpath, ignore_errors=True)
+        return None
     return output
 
 
+class KeyframeSplitter:
+    # Fed with ffprobe packet csv, cuts at the last video keyframe that keeps
+    # each part under the target size. Cuts are taken from the container start
+    # time, which ffmpeg shifts to zero before the segment muxer sees them
+    def __init__(self, video_index, target, start=0):
+        self.video_index = str(video_index).encode()
+        self.target = target
+        self.start = start
+        self.cuts = []
+        self.total = 0
+        self._part_start = 0
+        self._candidate = None
+        self._rest = b""
+
+    def feed(self, data):
+        lines = (self._rest + data).split(b"\n")
+        self._rest = lines.pop()
+        for line in lines:
+            self._packet(line)
+
+    def _cut_if_needed(self):
+        if (
+            self.total - self._part_start > self.target
+            and self._candidate
+            and self._candidate[1] > self._part_start
+        ):
+            self.cuts.append(self._candidate[0])
+            self._part_start = self._candidate[1]
+
+    def _packet(self, line):
+        fields = line.split(b",")
+        if len(fields) < 5:
+            return
+        try:
+            size = int(fields[3])
+        except ValueError:
+            return
+        if fields[0] == self.video_index and b"K" in fields[4]:
+            try:
+                pts = float(fields[1] if fields[1] != b"N/A" else fields[2])
+            except ValueError:
+                pts = self.start
+            pts -= self.start
+            if pts > 0:
+                self._cut_if_needed()
+                self._candidate = (pts, self.total)
+        self.total += size
+
+    def finish(self):
+        if self._rest:
+            self._packet(self._rest)
+            self._rest = b""
+        self._cut_if_needed()
+        return self.cuts
+
+
 class FFMpeg:
     def __init__(self, listener):
         self._listener = listener
@@ -585,7 +756,69 @@ class FFMpeg:
                 await remove(output)
         return False
 
-    async def sample_video(self, video_file, sample_duration, part_duration):
+    async def _sample_copy(self, video_file, output_file, segments):
+        # Concat demuxer cuts each segment at keyframes, no re-encode needed
+        concat_file = f"{output_file}.ffconcat"
+        source = video_file.replace("'", "'\\''")
+        lines = ["ffconcat version 1.0"]
+        for start, end in segments:
+            lines.extend([f"file '{source}'", f"inpoint {start}", f"outpoint {end}"])
+        async with aiopen(concat_file, "w") as f:
+            await f.write("\n".join(lines) + "\n")
+        cmd = [
+            BinConfig.FFMPEG_NAME,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-progress",
+            "pipe:1",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            concat_file,
+            "-map",
+            "0:v:0",
+            "-map",
+            "0:a?",
+            "-c",
+            "copy",
+            "-avoid_negative_ts",
+            "make_zero",
+            "-threads",
+            f"{max(1, cpu_no // 2)}",
+            output_file,
+        ]
+        try:
+            self._listener.subproc = await create_subprocess_exec(
+                *cmd, stdout=PIPE, stderr=PIPE
+            )
+            await self._ffmpeg_progress()
+            _, stderr = await self._listener.subproc.communicate()
+        finally:
+            with suppress(Exception):
+                await remove(concat_file)
+        code = self._listener.subproc.returncode
+        if code == 0:
+            return True
+        if code == -9:
+            self._listener.is_cancelled = True
+        else:
+            try:
+                stderr = stderr.decode().strip()
+            except Exception:
+                stderr = "Unable to decode the error!"
+            LOGGER.warning(
+                f"{stderr}. Stream copy sample failed, re-encoding instead. Path: {video_file}"
+            )
+        if await aiopath.exists(output_file):
+            await remove(output_file)
+        return False
+
+    async def sample_video(
+        self, video_file, sample_duration, part_duration, accurate=False
+    ):
         self.clear()
         self._total_time = sample_duration
         dir, name = video_file.rsplit("/", 1)
@@ -601,6 +834,16 @@ class FFMpeg:
             next_segment += time_interval
         segments.append((duration - part_duration, duration))
 
+        if not accurate:
+            if self._listener.is_cancelled:
+                return False
+            if await self._sample_copy(video_file, output_file, segments):
+                return output_file
+            if self._listener.is_cancelled:
+                return False
+            self.clear()
+            self._total_time = sample_duration
+
         filter_complex = ""
         for i, (start, end) in enumerate(segments):
             filter_complex += (
@@ -666,12 +909,134 @@ class FFMpeg:
                 await remove(output_file)
             return False
 
+    async def _split_by_keyframes(self, f_path, file_, split_size):
+        try:
+            ffresult, _ = await probe_media(f_path)
+        except Exception:
+            return None
+        video = next(
+            (
+                stream
+                for stream in (ffresult.streams if ffresult else None) or []
+                if stream.get("codec_type") == "video"
+                and stream.get("codec_name", "").lower() not in {"mjpeg", "png", "bmp"}
+            ),
+            None,
+        )
+        if video is None or "index" not in video:
+            return None
+        splitter = KeyframeSplitter(
+            video["index"], int(split_size * 0.99), ffresult.start_time
+        )
+        if self._listener.is_cancelled:
+            return False
+        self._listener.subproc = await create_subprocess_exec(
+            "ffprobe",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-show_entries",
+            "packet=stream_index,pts_time,dts_time,size,flags",
+            "-of",
+            "csv=p=0",
+            f_path,
+            stdout=PIPE,
+            stderr=DEVNULL,
+        )
+        while chunk := await self._listener.subproc.stdout.read(1024 * 1024):
+            await sync_to_async(splitter.feed, chunk)
+        code = await self._listener.subproc.wait()
+        if self._listener.is_cancelled:
+            return False
+        if code == -9:
+            self._listener.is_cancelled = True
+            return False
+        if code != 0 or not (cuts := splitter.finish()):
+            return None
+
+        base_name, extension = ospath.splitext(file_)
+        dirpath = ospath.dirname(f_path)
+        outputs = [
+            ospath.join(dirpath, f"{base_name}.part{i:03}{extension}")
+            for i in range(1, len(cuts) + 2)
+        ]
+        pattern = ospath.join(
+            dirpath.replace("%", "%%"),
+            f"{base_name.replace('%', '%%')}.part%03d{extension}",
+        )
+        cmd = [
+            BinConfig.FFMPEG_NAME,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-progress",
+            "pipe:1",
+            "-i",
+            f_path,
+            "-map",
+            "0",
+            "-map_chapters",
+            "-1",
+            "-c",
+            "copy",
+            "-f",
+            "segment",
+            "-segment_times",
+            ",".join(f"{cut:.6f}" for cut in cuts),
+            "-segment_start_number",
+            "1",
+            "-reset_timestamps",
+            "1",
+            "-threads",
+            f"{max(1, cpu_no // 2)}",
+            pattern,
+        ]
+        self._listener.subproc = await create_subprocess_exec(
+            *cmd, stdout=PIPE, stderr=PIPE
+        )
+        await self._ffmpeg_progress()
+        _, stderr = await self._listener.subproc.communicate()
+        code = self._listener.subproc.returncode
+        if self._listener.is_cancelled:
+            return False
+        if code == -9:
+            self._listener.is_cancelled = True
+            return False
+        if code == 0:
+            sizes = [
+                await aiopath.getsize(out) if await aiopath.exists(out) else 0
+                for out in outputs
+            ]
+            if all(0 < size <= self._listener.max_split_size for size in sizes):
+                return True
+            LOGGER.warning(
+                f"Keyframe split produced parts of {sizes} bytes, falling back to sequential split. Path: {f_path}"
+            )
+        else:
+            try:
+                stderr = stderr.decode().strip()
+            except Exception:
+                stderr = "Unable to decode the error!"
+            LOGGER.warning(
+                f"{stderr}. Keyframe split failed, falling back to sequential split. Path: {f_path}"
+            )
+        for out in outputs:
+            with suppress(Exception):
+                await remove(out)
+        return None
+
     async def split(self, f_path, file_, parts, split_size):
         self.clear()
         multi_streams = True
         self._total_time = duration = (await get_media_info(f_path))[0]
         base_name, extension = ospath.splitext(file_)
         split_size -= 3000000
+        if (
+            result := await self._split_by_keyframes(f_path, file_, split_size)
+        ) is not None:
+            return result
+        self.clear()
+        self._total_time = duration
         start_time = 0
         i = 1
         while i <= parts or start_time < duration - 4:
@@ -0,0 +1,254 @@
+from asyncio import Lock, gather, sleep
+from datetime import datetime, timedelta
+from time import time
+
+from ... import LOGGER, bot_loop, intervals, nzb_jobs, sabnzbd_client
+from ...core.torrent_manager import TorrentManager
+
+
+class QbitTorrent:
+    # Mirrors the TorrentInfo fields used by the bot over raw sync/maindata data
+    def __init__(self, hash_, data):
+        self.hash = hash_
+        self._data = data
+
+    def __getattr__(self, key):
+        try:
+            return self._data[key]
+        except KeyError as e:
+            raise AttributeError(key) from e
+
+    @property
+    def tags(self):
+        return [tag.strip() for tag in self._data.get("tags", "").split(",") if tag]
+
+    @property
+    def eta(self):
+        return timedelta(seconds=self._data.get("eta", 0))
+
+    @property
+    def seeding_time(self):
+        return timedelta(seconds=self._data.get("seeding_time", 0))
+
+    @property
+    def completion_on(self):
+        return datetime.fromtimestamp(self._data.get("completion_on", -1))
+
+
+class StatusSnapshot:
+    # Engines are polled in bulk per tick, only while status objects ask for them
+    INTERVAL = 2
+    IDLE_TIMEOUT = 30
+
+    aria2 = {}
+    qbit = {}
+    nzb_queue = {}
+    nzb_history = {}
+    qbit_rid = 0
+    qbit_version = 0
+    nzb_version = 0
+    nzb_history_update = 0
+    updated_at = 0
+    _watched = {}
+    _qbit_torrents = {}
+    _qbit_synced_at = 0
+    _qbit_lock = Lock()
+    _nzb_state = None
+    _nzb_synced_at = 0
+    _nzb_lock = Lock()
+
+    @classmethod
+    def _watch(cls, engine):
+        cls._watched[engine] = time()
+        if not intervals["snapshot"] and not intervals["stopAll"]:
+            intervals["snapshot"] = bot_loop.create_task(cls._run())
+
+    @classmethod
+    def aria2_download(cls, gid):
+        cls._watch("aria2")
+        return cls.aria2.get(gid)
+
+    @classmethod
+    def qbit_torrent(cls, tag):
+        cls._watch("qbit")
+        return cls.qbit.get(tag)
+
+    @classmethod
+    def qbit_torrents(cls):
+        return list(cls._qbit_torrents.values())
+
+    @classmethod
+    def nzb_job(cls, nzo_id):
+        cls._watch("nzb")
+        queue_slot = cls.nzb_queue.get(nzo_id)
+        history_slot = cls.nzb_history.get(nzo_id)
+        if queue_slot is None and history_slot is None:
+            return None
+        return queue_slot, history_slot
+
+    @classmethod
+    async def clear(cls, engine):
+        # Syncs apply deltas, so a reset must not land in the middle of one
+        if engine == "aria2":
+            cls.aria2 = {}
+        elif engine == "qbit":
+            async with cls._qbit_lock:
+                cls.qbit = {}
+                cls._qbit_torrents = {}
+                cls._qbit_synced_at = 0
+                cls.qbit_rid = 0
+        elif engine == "nzb":
+            async with cls._nzb_lock:
+                cls.nzb_queue = {}
+                cls.nzb_history = {}
+                cls.nzb_history_update = 0
+                cls._nzb_state = None
+                cls._nzb_synced_at = 0
+
+    @classmethod
+    async def _refresh_aria2(cls):
+        active, waiting = await gather(
+            TorrentManager.aria2.tellActive(), TorrentManager.aria2.tellWaiting(0, 1000)
+        )
+        cls.aria2 = {download["gid"]: download for download in active + waiting}
+
+    @classmethod
+    async def sync_qbit(cls):
+        # Callers outside the refresh loop keep the rid from being reaped
+        cls._watch("qbit")
+        return await cls._sync_qbit()
+
+    @classmethod
+    async def _sync_qbit(cls):
+        async with cls._qbit_lock:
+            if time() - cls._qbit_synced_at < cls.INTERVAL:
+                return cls.qbit_version
+            data = await TorrentManager.qbittorrent.sync.maindata(cls.qbit_rid)
+            if getattr(data, "full_update", False):
+                cls._qbit_torrents = {}
+            reindex = False
+            for hash_, changes in (getattr(data, "torrents", None) or {}).items():
+                if tor := cls._qbit_torrents.get(hash_):
+                    tor._data.update(changes)
+                    reindex = reindex or "tags" in changes
+                else:
+                    cls._qbit_torrents[hash_] = QbitTorrent(hash_, dict(changes))
+                    reindex = True
+            for hash_ in getattr(data, "torrents_removed", None) or []:
+                if cls._qbit_torrents.pop(hash_, None):
+                    reindex = True
+            if reindex or getattr(data, "full_update", False):
+                cls.qbit = {
+                    tor.tags[0]: tor for tor in cls._qbit_torrents.values() if tor.tags
+                }
+            cls.qbit_rid = data.rid
+            cls.qbit_version += 1
+            cls._qbit_synced_at = time()
+            return cls.qbit_version
+
+    @classmethod
+    async def _refresh_qbit(cls):
+        await cls._sync_qbit()
+
+    @classmethod
+    async def _nzb_downloads(cls, nzo_ids):
+        if not nzo_ids:
+            return {}
+        downloads = await sabnzbd_client.get_downloads(nzo_ids=nzo_ids)
+        return {slot["nzo_id"]: slot for slot in downloads["queue"]["slots"]}
+
+    @classmethod
+    async def sync_nzb(cls):
+        # One queue and one history call per tick for every tracked job. The
+        # queue is only asked about jobs that have not reached the history, and
+        # the history answers False while last_history_update is unchanged
+        async with cls._nzb_lock:
+            if time() - cls._nzb_synced_at < cls.INTERVAL:
+                return cls.nzb_version
+            cls._nzb_synced_at = time()
+            nzo_ids = list(nzb_jobs)
+            if not nzo_ids:
+                cls.nzb_queue = {}
+                cls.nzb_history = {}
+                return cls.nzb_version
+            # Post-processing progress does not always bump last_history_update,
+            # and a job can reach the history before it is tracked here
+            full_history = any(
+                slot["status"] not in ["Completed", "Failed"]
+                for slot in cls.nzb_history.values()
+            ) or any(
+                nzo_id not in cls.nzb_queue and nzo_id not in cls.nzb_history
+                for nzo_id in nzo_ids
+            )
+            queue, history = await gather(
+                cls._nzb_downloads(
+                    [nzo_id for nzo_id in nzo_ids if nzo_id not in cls.nzb_history]
+                ),
+                sabnzbd_client.get_history(
+                    nzo_ids=nzo_ids,
+                    last_history_update=None
+                    if full_history
+                    else cls.nzb_history_update or None,
+                ),
+            )
+            cls.nzb_queue = queue
+            if history := history["history"]:
+                cls.nzb_history = {slot["nzo_id"]: slot for slot in history["slots"]}
+                cls.nzb_history_update = history.get("last_history_update", 0)
+            else:
+                cls.nzb_history = {
+                    nzo_id: slot
+                    for nzo_id, slot in cls.nzb_history.items()
+                    if nzo_id in nzb_jobs
+                }
+            state = (
+                tuple(
+                    (nzo_id, slot["status"], slot["filename"], tuple(slot["labels"]))
+                    for nzo_id, slot in cls.nzb_queue.items()
+                ),
+                tuple(
+                    (nzo_id, slot["status"]) for nzo_id, slot in cls.nzb_history.items()
+                ),
+            )
+            if state != cls._nzb_state:
+                cls._nzb_state = state
+                cls.nzb_version += 1
+            return cls.nzb_version
+
+    @classmethod
+    async def _refresh_nzb(cls):
+        await cls.sync_nzb()
+
+    @classmethod
+    async def refresh(cls):
+        now = time()
+        refreshers = {
+            "aria2": cls._refresh_aria2,
+            "qbit": cls._refresh_qbit,
+            "nzb": cls._refresh_nzb,
+        }
+        engines = []
+        for engine, last in list(cls._watched.items()):
+            if now - last < cls.IDLE_TIMEOUT:
+                engines.append(engine)
+            else:
+                del cls._watched[engine]
+                await cls.clear(engine)
+        if not engines:
+            return False
+        results = await gather(
+            *(refreshers[engine]() for engine in engines), return_exceptions=True
+        )
+        for engine, result in zip(engines, results):
+            if isinstance(result, Exception):
+                LOGGER.error(f"{result}: Status snapshot, while refreshing {engine}")
+        cls.updated_at = time()
+        return True
+
+    @classmethod
+    async def _run(cls):
+        try:
+            while not intervals["stopAll"] and await cls.refresh():
+                await sleep(cls.INTERVAL)
+        finally:
+            intervals["snapshot"] = ""
@@ -1,5 +1,6 @@
 from asyncio import gather, iscoroutinefunction
 from html import escape
+from math import log
 from re import findall
 from time import time
 
@@ -18,6 +19,12 @@ from ..telegram_helper.bot_commands import BotCommands
 from ..telegram_helper.button_build import ButtonMaker
 
 SIZE_UNITS = ["B", "KB", "MB", "GB", "TB", "PB"]
+STATS_TTL = 3
+# ETA and Past lines are redrawn at least this often
+TIME_STEP = 10
+
+_bot_stats = {"time": 0, "text": ""}
+_task_blocks = {}
 
 
 class MirrorStatus:
@@ -75,12 +82,7 @@ STATUSES = {
 
 async def get_task_by_gid(gid: str):
     async with task_dict_lock:
-        for tk in task_dict.values():
-            if hasattr(tk, "seeding"):
-                await tk.update()
-            if tk.gid() == gid:
-                return tk
-        return None
+        return task_dict.get_by_gid(gid)
 
 
 async def get_specific_tasks(status, user_id):
@@ -215,7 +217,104 @@ def get_progress_bar_string(pct):
     return f"[{p_str}]"
 
 
-async def get_readable_message(sid, is_user, page_no=1, status="All", page_step=1):
+def get_bot_stats():
+    if time() - _bot_stats["time"] >= STATS_TTL:
+        _bot_stats["text"] = (
+            f"\n<blockquote>╭ <code>CPU  :</code> {cpu_percent()}%"
+            f"\n┊ <code>RAM  :</code> {virtual_memory().percent}%"
+            f"\n┊ <code>FREE :</code> {get_readable_file_size(disk_usage(DOWNLOAD_DIR).free)}"
+            f"\n╰ <code>UP   :</code> {get_readable_time(time() - bot_start_time)}</blockquote>"
+        )
+        _bot_stats["time"] = time()
+    return _bot_stats["text"]
+
+
+def _bucket(value, step=1.1):
+    return int(log(max(value, 0) + 1, step))
+
+
+def _task_fingerprint(task, tstatus, index):
+    try:
+        if tstatus == MirrorStatus.STATUS_SEED:
+            state = (
+                task.uploaded_bytes(),
+                _bucket(speed_string_to_bytes(task.seed_speed())),
+            )
+        elif tstatus != MirrorStatus.STATUS_QUEUEUP and task.listener.progress:
+            state = (
+                int(float(task.progress().strip("%") or 0) * 2),
+                _bucket(speed_string_to_bytes(task.speed())),
+                task.listener.proceed_count,
+                len(task.listener.files_to_proceed),
+            )
+        else:
+            state = (task.size(),)
+    except Exception:
+        state = (time(),)
+    step = int((time() - task.listener.message.date.timestamp()) // TIME_STEP)
+    return (id(task), index, tstatus, task.name(), task.listener.subname, step, *state)
+
+
+def _render_task(task, tstatus, index):
+    msg = f"<b>{index}.</b> "
+    msg += f"<b><code>{escape(f'{task.name()}')}</code></b>"
+    if task.listener.subname:
+        msg += f"\n╰ <b>Sub Name</b> → <i>{task.listener.subname}</i>"
+    elapsed = time() - task.listener.message.date.timestamp()
+
+    msg += f"\n<blockquote expandable>╭ <b>Task By {task.listener.message.from_user.mention(style='html')} </b>"
+
+    if (
+        tstatus not in [MirrorStatus.STATUS_SEED, MirrorStatus.STATUS_QUEUEUP]
+        and task.listener.progress
+    ):
+        progress = task.progress()
+        msg += f"\n┊ <code>{get_progress_bar_string(progress)}</code> <i>{progress}</i>"
+        if task.listener.subname:
+            subsize = f" / {get_readable_file_size(task.listener.subsize)}"
+            ac = len(task.listener.files_to_proceed)
+            count = f"( {task.listener.proceed_count} / {ac or '?'} )"
+        else:
+            subsize = ""
+            count = ""
+        if task.listener.is_super_chat:
+            msg += f"\n┊ <code>Status   :</code> <b><a href='{task.listener.message.link}'>{tstatus}</a></b>"
+        else:
+            msg += f"\n┊ <code>Status   :</code> <b>{tstatus}</b>"
+        msg += f"\n┊ <code>Done     :</code> <i>{task.processed_bytes()}{subsize}</i>"
+        msg += f"\n┊ <code>Total    :</code> <i>{task.size()}</i>"
+        if count:
+            msg += f"\n┊ <code>Count    :</code> <b>{count}</b>"
+        msg += f"\n┊ <code>Speed    :</code> <i>{task.speed()}</i>"
+        msg += f"\n┊ <code>ETA      :</code> <i>{task.eta()}</i>"
+        msg += f"\n┊ <code>Past     :</code> <i>{get_readable_time(elapsed + get_raw_time(task.eta()))} ({get_readable_time(elapsed)})</i>"
+        if tstatus == MirrorStatus.STATUS_DOWNLOAD and (
+            task.listener.is_torrent or task.listener.is_qbit
+        ):
+            try:
+                msg += f"\n┊ <code>Seeders  :</code> {task.seeders_num()}"
+                msg += f"\n┊ <code>Leechers :</code> {task.leechers_num()}"
+            except Exception:
+                pass
+        # TODO: Add Connected Peers
+    elif tstatus == MirrorStatus.STATUS_SEED:
+        msg += f"\n┊ <code>Status   :</code> <b>{tstatus}</b>"
+        msg += f"\n┊ <code>Done     :</code> <i>{task.uploaded_bytes()}</i>"
+        msg += f"\n┊ <code>Total    :</code> <i>{task.size()}</i>"
+        msg += f"\n┊ <code>Speed    :</code> <i>{task.seed_speed()}</i>"
+        msg += f"\n┊ <code>Ratio    :</code> <i>{task.ratio()}</i>"
+        msg += f"\n┊ <code>ETA      :</code> <i>{task.seeding_time()}</i>"
+        msg += f"\n┊ <code>Past     :</code> <i>{get_readable_time(elapsed)}</i>"
+    else:
+        msg += f"\n┊ <code>Size     :</code> <i>{task.size()}</i>"
+    msg += f"\n┊ <code>Engine   :</code> <i>{task.engine}</i>"
+    msg += f"\n╰ <code>Mode     :</code> <i>{task.listener.mode[1]}</i></blockquote>"
+    # TODO: Add Bt Sel
+    msg += f"\n<blockquote>⋗ <code>Stop :</code> <i>/{BotCommands.CancelTaskCommand[1]}_{task.gid()}</i></blockquote>\n\n"
+    return msg
+
+
+async def get_status_page(sid, is_user, page_no=1, status="All", page_step=1):
     msg = ""
     button = None
 
@@ -237,7 +336,8 @@ async def get_readable_message(sid, is_user, page_no=1, status="All", page_step=
     start_position = (page_no - 1) * STATUS_LIMIT
 
     for index, task in enumerate(
-        tasks[start_position : STATUS_LIMIT + start_position], start=1
+        tasks[start_position : STATUS_LIMIT + start_position],
+        start=start_position + 1,
     ):
         if status != "All":
             tstatus = status
@@ -245,61 +345,17 @@ async def get_readable_message(sid, is_user, page_no=1, status="All", page_step=
             tstatus = await task.status()
         else:
             tstatus = task.status()
-        msg += f"<b>{index + start_position}.</b> "
-        msg += f"<b><code>{escape(f'{task.name()}')}</code></b>"
-        if task.listener.subname:
-            msg += f"\n╰ <b>Sub Name</b> → <i>{task.listener.subname}</i>"
-        elapsed = time() - task.listener.message.date.timestamp()
-
-        msg += f"\n<blockquote expandable>╭ <b>Task By {task.listener.message.from_user.mention(style='html')} </b>"
-
-        if (
-            tstatus not in [MirrorStatus.STATUS_SEED, MirrorStatus.STATUS_QUEUEUP]
-            and task.listener.progress
-        ):
-            progress = task.progress()
-            msg += f"\n┊ <code>{get_progress_bar_string(progress)}</code> <i>{progress}</i>"
-            if task.listener.subname:
-                subsize = f" / {get_readable_file_size(task.listener.subsize)}"
-                ac = len(task.listener.files_to_proceed)
-                count = f"( {task.listener.proceed_count} / {ac or '?'} )"
-            else:
-                subsize = ""
-                count = ""
-            if task.listener.is_super_chat:
-                msg += f"\n┊ <code>Status   :</code> <b><a href='{task.listener.message.link}'>{tstatus}</a></b>"
-            else:
-                msg += f"\n┊ <code>Status   :</code> <b>{tstatus}</b>"
-            msg += f"\n┊ <code>Done     :</code> <i>{task.processed_bytes()}{subsize}</i>"
-            msg += f"\n┊ <code>Total    :</code> <i>{task.size()}</i>"
-            if count:
-                msg += f"\n┊ <code>Count    :</code> <b>{count}</b>"
-            msg += f"\n┊ <code>Speed    :</code> <i>{task.speed()}</i>"
-            msg += f"\n┊ <code>ETA      :</code> <i>{task.eta()}</i>"
-            msg += f"\n┊ <code>Past     :</code> <i>{get_readable_time(elapsed + get_raw_time(task.eta()))} ({get_readable_time(elapsed)})</i>"
-            if tstatus == MirrorStatus.STATUS_DOWNLOAD and (
-                task.listener.is_torrent or task.listener.is_qbit
-            ):
-                try:
-                    msg += f"\n┊ <code>Seeders  :</code> {task.seeders_num()}"
-                    msg += f"\n┊ <code>Leechers :</code> {task.leechers_num()}"
-                except Exception:
-                    pass
-            # TODO: Add Connected Peers
-        elif tstatus == MirrorStatus.STATUS_SEED:
-            msg += f"\n┊ <code>Status   :</code> <b>{tstatus}</b>"
-            msg += f"\n┊ <code>Done     :</code> <i>{task.uploaded_bytes()}</i>"
-            msg += f"\n┊ <code>Total    :</code> <i>{task.size()}</i>"
-            msg += f"\n┊ <code>Speed    :</code> <i>{task.seed_speed()}</i>"
-            msg += f"\n┊ <code>Ratio    :</code> <i>{task.ratio()}</i>"
-            msg += f"\n┊ <code>ETA      :</code> <i>{task.seeding_time()}</i>"
-            msg += f"\n┊ <code>Past     :</code> <i>{get_readable_time(elapsed)}</i>"
-        else:
-            msg += f"\n┊ <code>Size     :</code> <i>{task.size()}</i>"
-        msg += f"\n┊ <code>Engine   :</code> <i>{task.engine}</i>"
-        msg += f"\n╰ <code>Mode     :</code> <i>{task.listener.mode[1]}</i></blockquote>"
-        # TODO: Add Bt Sel
-        msg += f"\n<blockquote>⋗ <code>Stop :</code> <i>/{BotCommands.CancelTaskCommand[1]}_{task.gid()}</i></blockquote>\n\n"
+        key = (task.listener.mid, index)
+        fingerprint = _task_fingerprint(task, tstatus, index)
+        cached = _task_blocks.get(key)
+        if cached is None or cached[0] != fingerprint:
+            cached = (fingerprint, _render_task(task, tstatus, index))
+            _task_blocks[key] = cached
+        msg += cached[1]
+
+    for key in list(_task_blocks):
+        if key[0] not in task_dict:
+            del _task_blocks[key]
 
     if len(msg) == 0:
         if status == "All":
@@ -324,10 +380,11 @@ async def get_readable_message(sid, is_user, page_no=1, status="All", page_step=
                 buttons.data_button(label, f"status {sid} st {status_value}")
     buttons.data_button("sʏɴᴄ", f"status {sid} ref", position="header")
     button = buttons.build_menu(8)
-    msg += f"\n<blockquote>╭ <code>CPU  :</code> {cpu_percent()}%"
-    msg += f"\n┊ <code>RAM  :</code> {virtual_memory().percent}%"
-    msg += (
-        f"\n┊ <code>FREE :</code> {get_readable_file_size(disk_usage(DOWNLOAD_DIR).free)}"
-    )
-    msg += f"\n╰ <code>UP   :</code> {get_readable_time(time() - bot_start_time)}</blockquote>"
     return msg, button
+
+
+async def get_readable_message(sid, is_user, page_no=1, status="All", page_step=1):
+    msg, button = await get_status_page(sid, is_user, page_no, status, page_step)
+    if msg is None:
+        return None, None
+    return msg + get_bot_stats(), button
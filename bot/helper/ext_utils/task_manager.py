@@ -1,14 +1,18 @@
-from asyncio import Event
+from asyncio import Event, sleep
 from time import time
 
+from psutil import net_io_counters
+
 from ... import (
     LOGGER,
     bot_cache,
+    bot_loop,
     non_queued_dl,
     non_queued_up,
     queue_dict_lock,
     queued_dl,
     queued_up,
+    sudo_users,
     user_data,
 )
 from ...core.config_manager import Config
@@ -16,12 +20,18 @@ from ..mirror_leech_utils.gdrive_utils.search import GoogleDriveSearch
 from ..telegram_helper.filters import CustomFilters
 from ..telegram_helper.tg_utils import check_botpm, forcesub, verify_token
 from .bot_utils import get_telegraph_list, sync_to_async
-from .files_utils import get_base_name, check_storage_threshold
+from .files_utils import DiskLedger, check_storage_threshold, get_base_name
 from .links_utils import is_gdrive_id
 from .status_utils import get_readable_time, get_readable_file_size, get_specific_tasks
 
 
 async def stop_duplicate_check(listener):
+    if not listener.is_clone and not await DiskLedger.plan(listener):
+        return (
+            "Not enough free disk space for this task, even once the running "
+            "tasks are done!",
+            None,
+        )
     if (
         isinstance(listener.up_dest, int)
         or listener.is_leech
@@ -59,20 +69,103 @@ async def stop_duplicate_check(listener):
     return False, None
 
 
+class AdmissionControl:
+    # With QUEUE_ADAPTIVE, a download within the queue limits, if any are set,
+    # only starts while inbound throughput still grows, the disk ledger has
+    # room for it and the upload queue keeps up
+    SETTLE = 30
+    PROBE_AFTER = 300
+    GAIN = 1.1
+    MAX_UPLOAD_BACKLOG = 2
+    TICK = 10
+
+    rate = 0
+    admitted_mids = set()
+    _baseline = 0
+    _admitted_at = 0
+    _sample = (0, 0)
+    _task = None
+
+    @classmethod
+    def _measure(cls):
+        now, received = time(), net_io_counters().bytes_recv
+        last, last_received = cls._sample
+        if now - last >= 1:
+            if last:
+                rate = (received - last_received) / (now - last)
+                cls.rate = 0.3 * rate + 0.7 * cls.rate if cls.rate else rate
+            cls._sample = (now, received)
+        return cls.rate
+
+    @classmethod
+    async def allows(cls, mid, size, running):
+        if not Config.QUEUE_ADAPTIVE or not running:
+            return True
+        if len(queued_up) >= cls.MAX_UPLOAD_BACKLOG:
+            return False
+        if not await DiskLedger.has_room(DiskLedger.need(mid) or size, mid):
+            return False
+        elapsed = time() - cls._admitted_at
+        if elapsed < cls.SETTLE:
+            return False
+        return elapsed >= cls.PROBE_AFTER or cls._measure() >= cls._baseline * cls.GAIN
+
+    @classmethod
+    def admitted(cls, mid):
+        if not Config.QUEUE_ADAPTIVE:
+            return
+        cls._baseline = cls._measure()
+        cls._admitted_at = time()
+        cls.admitted_mids.add(mid)
+
+    @classmethod
+    def release(cls, mid):
+        if mid in cls.admitted_mids:
+            cls.admitted_mids.discard(mid)
+            cls._baseline = 0
+
+    @classmethod
+    def watch(cls):
+        if cls._task is None or cls._task.done():
+            cls._task = bot_loop.create_task(cls._run())
+
+    @classmethod
+    async def _run(cls):
+        # Throughput and free disk change without task events, so re-check
+        # the queue while downloads wait in it
+        while queued_dl:
+            if Config.QUEUE_ADAPTIVE:
+                cls._measure()
+            await DiskLedger.refresh()
+            await start_from_queued()
+            await sleep(cls.TICK)
+
+
+def queue_priority(listener):
+    if listener.user_id == Config.OWNER_ID:
+        return 0
+    if listener.user_id in sudo_users or user_data.get(listener.user_id, {}).get(
+        "SUDO"
+    ):
+        return 1
+    return 2
+
+
 async def check_running_tasks(listener, state="dl"):
     all_limit = Config.QUEUE_ALL
     state_limit = Config.QUEUE_DOWNLOAD if state == "dl" else Config.QUEUE_UPLOAD
     event = None
     is_over_limit = False
+    forced = (
+        listener.force_run
+        or (listener.force_upload and state == "up")
+        or (listener.force_download and state == "dl")
+    )
     async with queue_dict_lock:
         if state == "up" and listener.mid in non_queued_dl:
             non_queued_dl.remove(listener.mid)
-        if (
-            (all_limit or state_limit)
-            and not listener.force_run
-            and not (listener.force_upload and state == "up")
-            and not (listener.force_download and state == "dl")
-        ):
+            AdmissionControl.release(listener.mid)
+        if (all_limit or state_limit) and not forced:
             dl_count = len(non_queued_dl)
             up_count = len(non_queued_up)
             t_count = dl_count if state == "dl" else up_count
@@ -81,25 +174,41 @@ async def check_running_tasks(listener, state="dl"):
                 and dl_count + up_count >= all_limit
                 and (not state_limit or t_count >= state_limit)
             ) or (state_limit and t_count >= state_limit)
-            if is_over_limit:
-                event = Event()
-                if state == "dl":
-                    queued_dl[listener.mid] = event
-                else:
-                    queued_up[listener.mid] = event
-        if not is_over_limit:
-            if state == "up":
-                non_queued_up.add(listener.mid)
-            else:
-                non_queued_dl.add(listener.mid)
+        if not is_over_limit and not forced and state == "dl":
+            is_over_limit = not await AdmissionControl.allows(
+                listener.mid, listener.size, len(non_queued_dl)
+            )
+        # A download that does not fit on the disk yet waits in the queue
+        if not is_over_limit and state == "dl":
+            is_over_limit = not await DiskLedger.reserve(listener.mid)
+        if is_over_limit:
+            event = Event()
+            (queued_dl if state == "dl" else queued_up).add(
+                listener.mid,
+                event,
+                listener.user_id,
+                listener.size,
+                queue_priority(listener),
+            )
+            if state == "dl":
+                AdmissionControl.watch()
+        elif state == "up":
+            non_queued_up.add(listener.mid)
+        else:
+            non_queued_dl.add(listener.mid)
+            AdmissionControl.admitted(listener.mid)
 
     return is_over_limit, event
 
 
 async def start_dl_from_queued(mid: int):
+    if not await DiskLedger.reserve(mid):
+        return False
+    AdmissionControl.admitted(mid)
     queued_dl[mid].set()
     del queued_dl[mid]
     non_queued_dl.add(mid)
+    return True
 
 
 async def start_up_from_queued(mid: int):
@@ -119,14 +228,18 @@ async def start_from_queued():
             if all_ < all_limit:
                 f_tasks = all_limit - all_
                 if queued_up and (not up_limit or up < up_limit):
-                    for index, mid in enumerate(list(queued_up.keys()), start=1):
+                    for index, mid in enumerate(queued_up.ordered(), start=1):
                         await start_up_from_queued(mid)
                         f_tasks -= 1
                         if f_tasks == 0 or (up_limit and index >= up_limit - up):
                             break
                 if queued_dl and (not dl_limit or dl < dl_limit) and f_tasks != 0:
-                    for index, mid in enumerate(list(queued_dl.keys()), start=1):
-                        await start_dl_from_queued(mid)
+                    for index, mid in enumerate(queued_dl.ordered(), start=1):
+                        if not await AdmissionControl.allows(
+                            mid, queued_dl.size(mid), len(non_queued_dl)
+                        ) or not await start_dl_from_queued(mid):
+                            queued_dl.requeue(mid)
+                            break
                         if (dl_limit and index >= dl_limit - dl) or index == f_tasks:
                             break
         return
@@ -136,7 +249,7 @@ async def start_from_queued():
             up = len(non_queued_up)
             if queued_up and up < up_limit:
                 f_tasks = up_limit - up
-                for index, mid in enumerate(list(queued_up.keys()), start=1):
+                for index, mid in enumerate(queued_up.ordered(), start=1):
                     await start_up_from_queued(mid)
                     if index == f_tasks:
                         break
@@ -151,15 +264,22 @@ async def start_from_queued():
             dl = len(non_queued_dl)
             if queued_dl and dl < dl_limit:
                 f_tasks = dl_limit - dl
-                for index, mid in enumerate(list(queued_dl.keys()), start=1):
-                    await start_dl_from_queued(mid)
+                for index, mid in enumerate(queued_dl.ordered(), start=1):
+                    if not await AdmissionControl.allows(
+                        mid, queued_dl.size(mid), len(non_queued_dl)
+                    ) or not await start_dl_from_queued(mid):
+                        queued_dl.requeue(mid)
+                        break
                     if index == f_tasks:
                         break
     else:
         async with queue_dict_lock:
-            if queued_dl:
-                for mid in list(queued_dl.keys()):
-                    await start_dl_from_queued(mid)
+            for mid in queued_dl.ordered():
+                if not await AdmissionControl.allows(
+                    mid, queued_dl.size(mid), len(non_queued_dl)
+                ) or not await start_dl_from_queued(mid):
+                    queued_dl.requeue(mid)
+                    break
 
 
 async def limit_checker(listener, yt_playlist=0):
@@ -214,7 +334,10 @@ async def limit_checker(listener, yt_playlist=0):
         if Config.STORAGE_LIMIT and not listener.is_clone:
             limit = Config.STORAGE_LIMIT * 1024**3
             if not await check_storage_threshold(
-                size, limit, any([listener.compress, listener.extract])
+                size,
+                limit,
+                any([listener.compress, listener.extract]),
+                mid=listener.mid,
             ):
                 limit_exceeded = f"┊ <b>Threshold Storage Limit</b> → {get_readable_file_size(limit)}"
 
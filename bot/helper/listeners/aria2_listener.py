@@ -12,6 +12,7 @@ from ..ext_utils.files_utils import clean_unwanted
 from ..ext_utils.status_utils import get_task_by_gid
 from ..ext_utils.task_manager import stop_duplicate_check, limit_checker
 from ..mirror_leech_utils.status_utils.aria2_status import Aria2Status
+from .direct_listener import DirectListener
 from ..telegram_helper.message_utils import (
     send_message,
     delete_message,
@@ -79,7 +80,8 @@ async def _on_download_complete(api, data):
     if download.get("followedBy", []):
         new_gid = download.get("followedBy", [])[0]
         LOGGER.info(f"Gid changed from {gid} to {new_gid}")
-        if task := await get_task_by_gid(new_gid):
+        if task := await get_task_by_gid(new_gid) or await get_task_by_gid(gid):
+            task_dict.add_gid(new_gid, task.listener.mid)
             task.listener.is_torrent = True
             if Config.BASE_URL and task.listener.select:
                 if not task.queued:
@@ -197,3 +199,6 @@ def add_aria2_callbacks():
     TorrentManager.aria2.onDownloadError(_on_download_error)
     TorrentManager.aria2.onDownloadStart(_on_download_started)
     TorrentManager.aria2.onDownloadStop(_on_download_stopped)
+    TorrentManager.aria2.onDownloadComplete(DirectListener.on_aria2_event)
+    TorrentManager.aria2.onDownloadError(DirectListener.on_aria2_event)
+    TorrentManager.aria2.onDownloadStop(DirectListener.on_aria2_event)
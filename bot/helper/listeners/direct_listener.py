@@ -1,75 +1,130 @@
-from asyncio import sleep, TimeoutError
+from asyncio import (
+    Event,
+    gather,
+    wait_for,
+    TimeoutError as AsyncTimeoutError,
+)
+from contextlib import suppress
 from aiohttp.client_exceptions import ClientError
 
 from ... import LOGGER
+from ...core.config_manager import Config
 from ...core.torrent_manager import TorrentManager, aria2_name
+from ..ext_utils.status_snapshot import StatusSnapshot
 
 
 class DirectListener:
+    # Files run side by side and finish on aria2 notifications, a slow
+    # tellStatus only covers notifications lost while the websocket was down
+    CHECK_INTERVAL = 30
+    _events = {}
+
     def __init__(self, path, listener, a2c_opt):
         self.listener = listener
         self._path = path
         self._a2c_opt = a2c_opt
         self._proc_bytes = 0
         self._failed = 0
-        self.download_task = None
+        self._active = set()
         self.name = self.listener.name
 
+    @classmethod
+    async def on_aria2_event(cls, _, data):
+        if event := cls._events.get(data["params"][0]["gid"]):
+            event.set()
+
+    def _downloads(self):
+        return [
+            download
+            for gid in list(self._active)
+            if (download := StatusSnapshot.aria2_download(gid))
+        ]
+
     @property
     def processed_bytes(self):
-        if self.download_task:
-            return self._proc_bytes + int(
-                self.download_task.get("completedLength", "0")
-            )
-        return self._proc_bytes
+        return self._proc_bytes + sum(
+            int(download.get("completedLength", "0")) for download in self._downloads()
+        )
 
     @property
     def speed(self):
-        return (
-            int(self.download_task.get("downloadSpeed", "0"))
-            if self.download_task
-            else 0
+        return sum(
+            int(download.get("downloadSpeed", "0")) for download in self._downloads()
         )
 
-    async def download(self, contents):
-        self.is_downloading = True
-        for content in contents:
+    @property
+    def is_waiting(self):
+        downloads = self._downloads()
+        return bool(downloads) and all(
+            download.get("status", "") == "waiting" for download in downloads
+        )
+
+    async def _wait(self, gid):
+        event = self._events[gid]
+        while True:
+            download = await TorrentManager.aria2.tellStatus(gid)
+            if download.get("status", "") in ["complete", "error", "removed"]:
+                return download
             if self.listener.is_cancelled:
-                break
-            if content["path"]:
-                self._a2c_opt["dir"] = f"{self._path}/{content['path']}"
-            else:
-                self._a2c_opt["dir"] = self._path
-            filename = content["filename"]
-            self._a2c_opt["out"] = filename
-            try:
-                gid = await TorrentManager.aria2.addUri(
-                    uris=[content["url"]], options=self._a2c_opt, position=0
+                return download
+            with suppress(AsyncTimeoutError):
+                await wait_for(event.wait(), self.CHECK_INTERVAL)
+            event.clear()
+
+    async def _fetch(self, content):
+        if content["path"]:
+            directory = f"{self._path}/{content['path']}"
+        else:
+            directory = self._path
+        filename = content["filename"]
+        options = self._a2c_opt | {"dir": directory, "out": filename}
+        try:
+            gid = await TorrentManager.aria2.addUri(
+                uris=[content["url"]], options=options, position=0
+            )
+        except (TimeoutError, ClientError, Exception) as e:
+            self._failed += 1
+            LOGGER.error(f"Unable to download {filename} due to: {e}")
+            return
+        # A download that ends before the event exists is caught by the first
+        # tellStatus in _wait
+        self._events[gid] = Event()
+        self._active.add(gid)
+        download = {"gid": gid}
+        try:
+            download = await self._wait(gid)
+            if self.listener.is_cancelled:
+                return
+            if error_message := download.get("errorMessage"):
+                self._failed += 1
+                LOGGER.error(
+                    f"Unable to download {aria2_name(download)} due to: {error_message}"
                 )
-            except (TimeoutError, ClientError, Exception) as e:
+            elif download.get("status", "") == "complete":
+                self._proc_bytes += int(download.get("totalLength", "0"))
+            else:
                 self._failed += 1
-                LOGGER.error(f"Unable to download {filename} due to: {e}")
-                continue
-            self.download_task = await TorrentManager.aria2.tellStatus(gid)
-            while True:
-                if self.listener.is_cancelled:
-                    if self.download_task:
-                        await TorrentManager.aria2_remove(self.download_task)
-                    break
-                self.download_task = await TorrentManager.aria2.tellStatus(gid)
-                if error_message := self.download_task.get("errorMessage"):
-                    self._failed += 1
-                    LOGGER.error(
-                        f"Unable to download {aria2_name(self.download_task)} due to: {error_message}"
-                    )
-                    await TorrentManager.aria2_remove(self.download_task)
-                    break
-                elif self.download_task.get("status", "") == "complete":
-                    self._proc_bytes += int(self.download_task.get("totalLength", "0"))
-                    await TorrentManager.aria2_remove(self.download_task)
-                    break
-                await sleep(1)
-            self.download_task = None
+                LOGGER.error(f"Download of {filename} was removed from aria2")
+        except (TimeoutError, ClientError, Exception) as e:
+            self._failed += 1
+            LOGGER.error(f"Unable to download {filename} due to: {e}")
+        finally:
+            self._active.discard(gid)
+            self._events.pop(gid, None)
+            with suppress(Exception):
+                await TorrentManager.aria2_remove(download)
+
+    async def _worker(self, contents):
+        for content in contents:
+            if self.listener.is_cancelled:
+                break
+            await self._fetch(content)
+
+    async def download(self, contents):
+        self.is_downloading = True
+        contents_iter = iter(contents)
+        workers = min(len(contents), max(1, int(Config.DIRECT_PARALLEL or 1)))
+        await gather(*(self._worker(contents_iter) for _ in range(workers)))
         if self.listener.is_cancelled:
             return
         if self._failed == len(contents):
@@ -82,5 +137,8 @@ class DirectListener:
         self.listener.is_cancelled = True
         LOGGER.info(f"Cancelling Download: {self.listener.name}")
         await self.listener.on_download_error("Download Cancelled by User!")
-        if self.download_task:
-            await TorrentManager.aria2_remove(self.download_task)
+        for gid in list(self._active):
+            with suppress(Exception):
+                await TorrentManager.aria2.forceRemove(gid)
+            if event := self._events.get(gid):
+                event.set()
@@ -8,6 +8,7 @@ from ... import (
     LOGGER,
 )
 from ..ext_utils.bot_utils import new_task
+from ..ext_utils.status_snapshot import StatusSnapshot
 from ..ext_utils.status_utils import get_task_by_gid, get_raw_file_size
 from ..ext_utils.task_manager import stop_duplicate_check, limit_checker
 
@@ -63,45 +64,49 @@ async def _on_download_complete(nzo_id):
         await _remove_job(nzo_id, task.listener.mid)
 
 
+async def _dispatch():
+    # Callbacks are new tasks, so one slow job never holds up the others
+    for nzo_id, job in StatusSnapshot.nzb_history.items():
+        if (state := nzb_jobs.get(nzo_id)) is None or state["status"] != "Downloading":
+            continue
+        if job["status"] == "Completed":
+            state["uploaded"] = True
+            state["status"] = "Completed"
+            await _on_download_complete(nzo_id)
+        elif job["status"] == "Failed":
+            state["status"] = "Failed"
+            await _on_download_error(job["fail_message"], nzo_id)
+    for nzo_id, dl in StatusSnapshot.nzb_queue.items():
+        if (state := nzb_jobs.get(nzo_id)) is None or state["status"] != "Downloading":
+            continue
+        if dl["labels"] and dl["labels"][0] == "ALTERNATIVE":
+            state["status"] = "Failed"
+            await _on_download_error("Duplicated Job!", nzo_id)
+            continue
+        if dl["status"] == "Downloading" and not dl["filename"].startswith("Trying"):
+            if not state["stop_dup_check"]:
+                state["stop_dup_check"] = True
+                await _stop_duplicate(nzo_id)
+            if not state["size_check"]:
+                state["size_check"] = True
+                await _size_check(nzo_id)
+
+
 @new_task
 async def _nzb_listener():
+    version = None
     while not intervals["stopAll"]:
-        async with nzb_listener_lock:
-            try:
-                jobs = (await sabnzbd_client.get_history())["history"]["slots"]
-                downloads = (await sabnzbd_client.get_downloads())["queue"]["slots"]
+        try:
+            current = await StatusSnapshot.sync_nzb()
+            async with nzb_listener_lock:
                 if len(nzb_jobs) == 0:
                     intervals["nzb"] = ""
                     break
-                for job in jobs:
-                    nzo_id = job["nzo_id"]
-                    if nzo_id not in nzb_jobs:
-                        continue
-                    if job["status"] == "Completed":
-                        if not nzb_jobs[nzo_id]["uploaded"]:
-                            nzb_jobs[nzo_id]["uploaded"] = True
-                            await _on_download_complete(nzo_id)
-                            nzb_jobs[nzo_id]["status"] = "Completed"
-                    elif job["status"] == "Failed":
-                        await _on_download_error(job["fail_message"], nzo_id)
-                for dl in downloads:
-                    nzo_id = dl["nzo_id"]
-                    if nzo_id not in nzb_jobs:
-                        continue
-                    if dl["labels"] and dl["labels"][0] == "ALTERNATIVE":
-                        await _on_download_error("Duplicated Job!", nzo_id)
-                        continue
-                    if dl["status"] == "Downloading" and not dl["filename"].startswith(
-                        "Trying"
-                    ):
-                        if not nzb_jobs[nzo_id]["stop_dup_check"]:
-                            nzb_jobs[nzo_id]["stop_dup_check"] = True
-                            await _stop_duplicate(nzo_id)
-                        if not nzb_jobs[nzo_id]["size_check"]:
-                            nzb_jobs[nzo_id]["size_check"] = True
-                            await _size_check(nzo_id)
-            except Exception as e:
-                LOGGER.error(str(e))
+                if current != version:
+                    version = current
+                    await _dispatch()
+        except Exception as e:
+            LOGGER.error(str(e))
         await sleep(3)
 
 
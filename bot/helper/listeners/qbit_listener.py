@@ -16,6 +16,7 @@ from ...core.config_manager import Config
 from ...core.torrent_manager import TorrentManager
 from ..ext_utils.bot_utils import new_task
 from ..ext_utils.files_utils import clean_unwanted
+from ..ext_utils.status_snapshot import StatusSnapshot
 from ..ext_utils.status_utils import get_readable_time, get_task_by_gid
 from ..ext_utils.task_manager import stop_duplicate_check, limit_checker
 from ..mirror_leech_utils.status_utils.qbit_status import QbittorrentStatus
@@ -122,11 +123,14 @@ async def _qb_listener():
     while True:
         async with qb_listener_lock:
             try:
-                torrents = await TorrentManager.qbittorrent.torrents.info()
+                await StatusSnapshot.sync_qbit()
+                torrents = StatusSnapshot.qbit_torrents()
                 if len(torrents) == 0:
                     intervals["qb"] = ""
                     break
                 for tor_info in torrents:
+                    if not tor_info.tags:
+                        continue
                     tag = tor_info.tags[0]
                     if tag not in qb_torrents:
                         continue
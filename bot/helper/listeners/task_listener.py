@@ -28,6 +28,8 @@ from ...core.torrent_manager import TorrentManager
 from ..ext_utils.bot_utils import encode_slink, sync_to_async
 from ..ext_utils.db_handler import database
 from ..ext_utils.files_utils import (
+    DiskLedger,
+    FileSplitter,
     clean_download,
     clean_target,
     create_recursive_symlink,
@@ -38,9 +40,14 @@ from ..ext_utils.files_utils import (
 )
 from ..ext_utils.links_utils import is_gdrive_id
 from ..ext_utils.status_utils import get_readable_file_size, get_readable_time
-from ..ext_utils.task_manager import check_running_tasks, start_from_queued
+from ..ext_utils.task_manager import (
+    AdmissionControl,
+    check_running_tasks,
+    start_from_queued,
+)
 from ..mirror_leech_utils.gdrive_utils.upload import GoogleDriveUpload
 from ..mirror_leech_utils.rclone_utils.transfer import RcloneTransferHelper
+from ..mirror_leech_utils.status_utils.ffmpeg_status import FFmpegStatus
 from ..mirror_leech_utils.status_utils.gdrive_status import GoogleDriveStatus
 from ..mirror_leech_utils.status_utils.queue_status import QueueStatus
 from ..mirror_leech_utils.status_utils.rclone_status import RcloneStatus
@@ -155,6 +162,7 @@ class TaskListener(TaskConfig):
             self.name = download.name()
             gid = download.gid()
         LOGGER.info(f"Download completed: {self.name}")
+        DiskLedger.release(self.mid, "download")
 
         if not (self.is_torrent or self.is_qbit):
             self.seed = False
@@ -200,15 +208,22 @@ class TaskListener(TaskConfig):
             async with queue_dict_lock:
                 if self.mid in non_queued_dl:
                     non_queued_dl.remove(self.mid)
+                    AdmissionControl.release(self.mid)
             await start_from_queued()
 
         if self.join and not self.is_file:
-            await join_files(up_path)
+            splitter = FileSplitter(self)
+            async with task_dict_lock:
+                task_dict[self.mid] = FFmpegStatus(self, splitter, gid, "Join")
+            await join_files(up_path, splitter)
+            if self.is_cancelled:
+                return
 
         if self.extract and not self.is_nzb:
             up_path = await self.proceed_extract(up_path, gid)
             if self.is_cancelled:
                 return
+            DiskLedger.release(self.mid, "extract")
             self.is_file = await aiopath.isfile(up_path)
             self.name = up_path.replace(f"{up_dir}/", "").split("/", 1)[0]
             self.size = await get_path_size(up_dir)
@@ -278,6 +293,7 @@ class TaskListener(TaskConfig):
             self.is_file = await aiopath.isfile(up_path)
             if self.is_cancelled:
                 return
+            DiskLedger.release(self.mid, "compress")
             self.clear()
 
         self.name = up_path.replace(f"{up_dir}/", "").split("/", 1)[0]
@@ -287,6 +303,7 @@ class TaskListener(TaskConfig):
             await self.proceed_split(up_path, gid)
             if self.is_cancelled:
                 return
+            DiskLedger.release(self.mid, "split")
             self.clear()
 
         self.subproc = None
@@ -339,6 +356,7 @@ class TaskListener(TaskConfig):
     async def on_upload_complete(
         self, link, files, folders, mime_type, rclone_path="", dir_id=""
     ):
+        DiskLedger.release(self.mid)
         if (
             self.is_super_chat
             and Config.INCOMPLETE_TASK_NOTIFIER
@@ -490,6 +508,7 @@ class TaskListener(TaskConfig):
         await start_from_queued()
 
     async def on_download_error(self, error, button=None, is_limit=False):
+        DiskLedger.release(self.mid)
         async with task_dict_lock:
             if self.mid in task_dict:
                 del task_dict[self.mid]
@@ -535,6 +554,7 @@ class TaskListener(TaskConfig):
                 del queued_up[self.mid]
             if self.mid in non_queued_dl:
                 non_queued_dl.remove(self.mid)
+                AdmissionControl.release(self.mid)
             if self.mid in non_queued_up:
                 non_queued_up.remove(self.mid)
 
@@ -547,6 +567,7 @@ class TaskListener(TaskConfig):
             await remove(self.thumb)
 
     async def on_upload_error(self, error):
+        DiskLedger.release(self.mid)
         async with task_dict_lock:
             if self.mid in task_dict:
                 del task_dict[self.mid]
@@ -573,6 +594,7 @@ class TaskListener(TaskConfig):
                 del queued_up[self.mid]
             if self.mid in non_queued_dl:
                 non_queued_dl.remove(self.mid)
+                AdmissionControl.release(self.mid)
             if self.mid in non_queued_up:
                 non_queued_up.remove(self.mid)
 
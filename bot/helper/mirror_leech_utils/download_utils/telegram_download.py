@@ -93,6 +93,8 @@ class TelegramDownloadHelper:
                         progress=self._on_download_progress,
                         dump_chat=Config.LEECH_DUMP_CHAT,
                     )
+                except (FloodWait, FloodPremiumWait):
+                    raise
                 except Exception:
                     if getattr(Config, "USER_TRANSMISSION", False):
                         try:
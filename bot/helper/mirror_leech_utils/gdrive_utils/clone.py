@@ -1,6 +1,7 @@
 from googleapiclient.errors import HttpError
 from logging import getLogger
 from os import path as ospath
+from orjson import loads as json_loads
 from tenacity import (
     retry,
     wait_exponential,
@@ -141,7 +142,9 @@ class GoogleDriveClone(GoogleDriveHelper):
             )
         except HttpError as err:
             if err.resp.get("content-type", "").startswith("application/json"):
-                reason = eval(err.content).get("error").get("errors")[0].get("reason")
+                reason = (
+                    json_loads(err.content).get("error").get("errors")[0].get("reason")
+                )
                 if reason not in [
                     "userRateLimitExceeded",
                     "dailyLimitExceeded",
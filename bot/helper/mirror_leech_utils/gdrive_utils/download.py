@@ -3,6 +3,7 @@ from googleapiclient.http import MediaIoBaseDownload
 from io import FileIO
 from logging import getLogger
 from os import makedirs, path as ospath
+from orjson import loads as json_loads
 from tenacity import (
     retry,
     wait_exponential,
@@ -134,7 +135,10 @@ class GoogleDriveDownload(GoogleDriveHelper):
                     continue
                 if err.resp.get("content-type", "").startswith("application/json"):
                     reason = (
-                        eval(err.content).get("error").get("errors")[0].get("reason")
+                        json_loads(err.content)
+                        .get("error")
+                        .get("errors")[0]
+                        .get("reason")
                     )
                     if "fileNotDownloadable" in reason and "document" in mime_type:
                         return self._download_file(
@@ -2,6 +2,7 @@ from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 from logging import getLogger
 from os import path as ospath, listdir, remove
+from orjson import loads as json_loads
 from tenacity import (
     retry,
     wait_exponential,
@@ -172,7 +173,10 @@ class GoogleDriveUpload(GoogleDriveHelper):
                     continue
                 if err.resp.get("content-type", "").startswith("application/json"):
                     reason = (
-                        eval(err.content).get("error").get("errors")[0].get("reason")
+                        json_loads(err.content)
+                        .get("error")
+                        .get("errors")[0]
+                        .get("reason")
                     )
                     if reason not in [
                         "userRateLimitExceeded",
@@ -1,7 +1,8 @@
 from time import time
 
-from .... import LOGGER
+from .... import LOGGER, task_dict
 from ....core.torrent_manager import TorrentManager, aria2_name
+from ...ext_utils.status_snapshot import StatusSnapshot
 from ...ext_utils.status_utils import (
     EngineStatus,
     MirrorStatus,
@@ -11,6 +12,8 @@ from ...ext_utils.status_utils import (
 
 
 async def get_download(gid, old_info=None):
+    if res := StatusSnapshot.aria2_download(gid):
+        return res
     try:
         res = await TorrentManager.aria2.tellStatus(gid)
         return res or old_info
@@ -33,6 +36,7 @@ class Aria2Status:
         self._download = await get_download(self._gid, self._download)
         if self._download.get("followedBy", []):
             self._gid = self._download["followedBy"][0]
+            task_dict.add_gid(self._gid, self.listener.mid)
             self._download = await get_download(self._gid)
 
     def progress(self):
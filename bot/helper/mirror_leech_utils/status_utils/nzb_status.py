@@ -2,6 +2,7 @@ from asyncio import gather
 from collections import defaultdict
 
 from .... import LOGGER, sabnzbd_client, nzb_jobs, nzb_listener_lock
+from ...ext_utils.status_snapshot import StatusSnapshot
 from ...ext_utils.status_utils import (
     MirrorStatus,
     EngineStatus,
@@ -11,45 +12,47 @@ from ...ext_utils.status_utils import (
 )
 
 
+def _get_job_info(queue_slot, history_slot, old_info):
+    if queue_slot:
+        if msg := queue_slot["labels"]:
+            LOGGER.warning(" | ".join(msg))
+        return queue_slot
+    if slot := history_slot:
+        if slot["status"] == "Verifying":
+            percentage = slot["action_line"].split("Verifying: ")[-1].split("/")
+            percentage = round(
+                (int(float(percentage[0])) / int(float(percentage[1]))) * 100, 2
+            )
+            old_info["percentage"] = percentage
+        elif slot["status"] == "Repairing":
+            action = slot["action_line"].split("Repairing: ")[-1].split()
+            percentage = action[0].strip("%")
+            eta = action[2]
+            old_info["percentage"] = percentage
+            old_info["timeleft"] = eta
+        elif slot["status"] == "Extracting":
+            if "Unpacking" in slot["action_line"]:
+                action = slot["action_line"].split("Unpacking: ")[-1].split()
+            else:
+                action = slot["action_line"].split("Direct Unpack: ")[-1].split()
+            percentage = action[0].split("/")
+            percentage = round(
+                (int(float(percentage[0])) / int(float(percentage[1]))) * 100, 2
+            )
+            eta = action[2]
+            old_info["percentage"] = percentage
+            old_info["timeleft"] = eta
+        old_info["status"] = slot["status"]
+    return old_info
+
+
 async def get_download(nzo_id, old_info):
     try:
-        queue = await sabnzbd_client.get_downloads(nzo_ids=nzo_id)
-        if res := queue["queue"]["slots"]:
-            slot = res[0]
-            if msg := slot["labels"]:
-                LOGGER.warning(" | ".join(msg))
-            return slot
-        else:
-            history = await sabnzbd_client.get_history(nzo_ids=nzo_id)
-            if res := history["history"]["slots"]:
-                slot = res[0]
-                if slot["status"] == "Verifying":
-                    percentage = slot["action_line"].split("Verifying: ")[-1].split("/")
-                    percentage = round(
-                        (int(float(percentage[0])) / int(float(percentage[1]))) * 100, 2
-                    )
-                    old_info["percentage"] = percentage
-                elif slot["status"] == "Repairing":
-                    action = slot["action_line"].split("Repairing: ")[-1].split()
-                    percentage = action[0].strip("%")
-                    eta = action[2]
-                    old_info["percentage"] = percentage
-                    old_info["timeleft"] = eta
-                elif slot["status"] == "Extracting":
-                    if "Unpacking" in slot["action_line"]:
-                        action = slot["action_line"].split("Unpacking: ")[-1].split()
-                    else:
-                        action = (
-                            slot["action_line"].split("Direct Unpack: ")[-1].split()
-                        )
-                    percentage = action[0].split("/")
-                    percentage = round(
-                        (int(float(percentage[0])) / int(float(percentage[1]))) * 100, 2
-                    )
-                    eta = action[2]
-                    old_info["percentage"] = percentage
-                    old_info["timeleft"] = eta
-                old_info["status"] = slot["status"]
+        if (job := StatusSnapshot.nzb_job(nzo_id)) is None:
+            await StatusSnapshot.sync_nzb()
+            job = StatusSnapshot.nzb_job(nzo_id)
+        if job:
+            return _get_job_info(*job, old_info)
         return old_info
     except Exception as e:
         LOGGER.error(f"{e}: Sabnzbd, while getting job info. ID: {nzo_id}")
@@ -1,7 +1,8 @@
 from asyncio import sleep, gather
 
-from .... import LOGGER, qb_torrents, qb_listener_lock
+from .... import LOGGER, qb_torrents, qb_listener_lock, task_dict
 from ....core.torrent_manager import TorrentManager
+from ...ext_utils.status_snapshot import StatusSnapshot
 from ...ext_utils.status_utils import (
     MirrorStatus,
     EngineStatus,
@@ -11,6 +12,8 @@ from ...ext_utils.status_utils import (
 
 
 async def get_download(tag, old_info=None):
+    if res := StatusSnapshot.qbit_torrent(tag):
+        return res
     try:
         res = (await TorrentManager.qbittorrent.torrents.info(tag=tag))[0]
         return res or old_info
@@ -89,9 +92,14 @@ class QbittorrentStatus:
         return self
 
     def gid(self):
-        return self.hash()[:12]
+        # The hash is only known once qBittorrent has the torrent
+        gid = self.hash()[:12]
+        task_dict.add_gid(gid, self.listener.mid)
+        return gid
 
     def hash(self):
+        if self._info is None:
+            self._info = StatusSnapshot.qbit.get(f"{self.listener.mid}")
         return self._info.hash
 
     async def cancel_task(self):
@@ -61,10 +61,8 @@ class SevenZStatus:
     async def cancel_task(self):
         LOGGER.info(f"Cancelling {self._cstatus}: {self.listener.name}")
         self.listener.is_cancelled = True
-        if (
-            self.listener.subproc is not None
-            and self.listener.subproc.returncode is None
-        ):
-            with suppress(Exception):
-                self.listener.subproc.kill()
+        for proc in self._obj.procs:
+            if proc.returncode is None:
+                with suppress(Exception):
+                    proc.kill()
         await self.listener.on_upload_error(f"{self._cstatus} stopped by user!")
@@ -1,4 +1,4 @@
-from asyncio import sleep
+from asyncio import create_task, sleep, wait
 from logging import getLogger
 from os import path as ospath, walk
 from re import match as re_match, sub as re_sub
@@ -7,6 +7,7 @@ from time import time
 from aioshutil import rmtree
 from natsort import natsorted
 from PIL import Image
+from pyrogram import StopTransmission
 from pyrogram.errors import BadRequest, FloodWait, RPCError
 
 try:
@@ -34,15 +35,22 @@ from tenacity import (
 from ....core.config_manager import Config
 from ....core.tg_client import TgClient
 from ...ext_utils.bot_utils import sync_to_async
-from ...ext_utils.files_utils import get_base_name, is_archive
+from ...ext_utils.files_utils import (
+    FileSlice,
+    FileSplitter,
+    get_base_name,
+    is_archive,
+)
+from ...ext_utils.hyperul_utils import HyperTGUpload
 from ...ext_utils.status_utils import get_readable_file_size, get_readable_time
 from ...ext_utils.media_utils import (
+    drop_probe,
     get_audio_thumbnail,
     get_document_type,
     get_media_info,
     get_multiple_frames_thumbnail,
     get_video_thumbnail,
-    get_md5_hash,
+    hash_file,
 )
 from ...telegram_helper.message_utils import delete_message
 
@@ -76,6 +84,12 @@ class TelegramUploader:
         self._log_msg = None
         self._user_session = self._listener.user_transmission
         self._error = ""
+        self._probes = {}
+        self._splitter = FileSplitter(listener)
+        self._splits = {}
+        self._split_left = {}
+        self._cut_tasks = {}
+        self._slice = None
 
     async def _upload_progress(self, current, _):
         if self._listener.is_cancelled:
@@ -87,6 +101,35 @@ class TelegramUploader:
         self._last_uploaded = current
         self._processed_bytes += chunk_size
 
+    async def _hyper_upload(self, kind, caption, thumb, **kwargs):
+        # None means the single session upload should run instead, a
+        # cancelled upload raises StopTransmission
+        size = self._slice.size if self._slice else await aiopath.getsize(self._up_path)
+        if not HyperTGUpload.supports(size):
+            return None
+        uploader = HyperTGUpload(
+            self._sent_msg._client, self._listener, self._upload_progress
+        )
+        try:
+            return await uploader.send_media(
+                self._sent_msg,
+                self._slice or self._up_path,
+                caption,
+                thumb,
+                kind,
+                **kwargs,
+            )
+        except (FloodWait, FloodPremiumWait, StopTransmission):
+            raise
+        except Exception as e:
+            if uploader.sent:
+                LOGGER.error(f"HyperUL sent the file but lost its message: {e}")
+                return self._sent_msg
+            LOGGER.warning(f"HyperUL failed, using single session upload: {e}")
+            self._processed_bytes -= self._last_uploaded
+            self._last_uploaded = 0
+            return None
+
     async def _user_settings(self):
         settings_map = {
             "MEDIA_GROUP": ("_media_group", False),
@@ -184,15 +227,28 @@ class TelegramUploader:
                 r"\{([^}]+)\}", lambda m: f"{{{m.group(1).lower()}}}", parts[0]
             )
             up_path = ospath.join(dirpath, pre_file_)
-            dur, qual, lang, subs = await get_media_info(up_path, True)
+            if self._slice:
+                dur, qual, lang, subs = 0, "", "", ""
+                size = self._slice.size
+                hash_args = (self._slice.path, "md5")
+                hash_kwargs = {"offset": self._slice.offset, "length": size}
+            else:
+                dur, qual, lang, subs = await get_media_info(up_path, True)
+                size = await aiopath.getsize(up_path)
+                hash_args = (up_path, "md5")
+                hash_kwargs = {}
             cap_mono = parts[0].format(
                 filename=cap_file_,
-                size=get_readable_file_size(await aiopath.getsize(up_path)),
+                size=get_readable_file_size(size),
                 duration=get_readable_time(dur),
                 quality=qual,
                 languages=lang,
                 subtitles=subs,
-                md5_hash=await sync_to_async(get_md5_hash, up_path),
+                md5_hash=(
+                    (await hash_file(*hash_args, **hash_kwargs))["md5"]
+                    if "{md5_hash" in parts[0]
+                    else ""
+                ),
                 mime_type=self._listener.file_details.get("mime_type", "text/plain"),
                 prefilename=self._listener.file_details.get("filename", ""),
                 precaption=self._listener.file_details.get("caption", ""),
@@ -234,7 +290,13 @@ class TelegramUploader:
 
         if pre_file_ != file_:
             new_path = ospath.join(dirpath, file_)
-            await rename(self._up_path, new_path)
+            if self._slice:
+                self._slice.name = file_
+            else:
+                # A prefetched probe still reads the file under its old name
+                if (probe := self._probes.get(self._up_path)) and not probe.done():
+                    await wait([probe])
+                await rename(self._up_path, new_path)
             self._up_path = new_path
 
         return cap_mono
@@ -327,22 +389,41 @@ class TelegramUploader:
                 await self._send_screenshots(dirpath, files)
                 await rmtree(dirpath, ignore_errors=True)
                 continue
-            for file_ in natsorted(files):
+            files = await self._expand_splits(dirpath, natsorted(files))
+            for index, file_ in enumerate(files):
+                self._prefetch(
+                    dirpath, files[index + 1 : index + 1 + int(Config.LEECH_PREFETCH)]
+                )
                 self._error = ""
                 self._up_path = f_path = ospath.join(dirpath, file_)
-                if not await aiopath.exists(self._up_path):
+                if f_path in self._splits:
+                    if Config.LEECH_VIRTUAL_SPLIT:
+                        self._open_slice(f_path)
+                    else:
+                        await self._cut_part(f_path)
+                    if self._listener.is_cancelled:
+                        await self._drop_pending()
+                        return
+                if not self._slice and not await aiopath.exists(self._up_path):
                     LOGGER.error(f"{self._up_path} not exists! Continue uploading!")
                     continue
                 try:
-                    f_size = await aiopath.getsize(self._up_path)
+                    f_size = (
+                        self._slice.size
+                        if self._slice
+                        else await aiopath.getsize(self._up_path)
+                    )
                     self._total_files += 1
                     if f_size == 0:
                         LOGGER.error(
                             f"{self._up_path} size is zero, telegram don't upload zero size files"
                         )
                         self._corrupted += 1
+                        if self._slice:
+                            await self._close_slice()
                         continue
                     if self._listener.is_cancelled:
+                        await self._drop_pending()
                         return
                     cap_mono = await self._prepare_file(file_, dirpath)
                     if self._last_msg_in_group:
@@ -369,11 +450,13 @@ class TelegramUploader:
                             )
                     self._last_msg_in_group = False
                     self._last_uploaded = 0
+                    started = time()
                     await self._upload_file(cap_mono, file_, f_path)
                     if self._log_msg and not is_log_del and Config.CLEAN_LOG_MSG:
                         await delete_message(self._log_msg)
                         is_log_del = True
                     if self._listener.is_cancelled:
+                        await self._drop_pending()
                         return
                     if (
                         not self._is_corrupted
@@ -381,7 +464,7 @@ class TelegramUploader:
                         and not self._is_private
                     ):
                         self._msgs_dict[self._sent_msg.link] = file_
-                    await sleep(1)
+                    await sleep(max(0, 1 - (time() - started)))
                 except Exception as err:
                     if isinstance(err, RetryError):
                         LOGGER.info(
@@ -392,11 +475,16 @@ class TelegramUploader:
                     self._error = str(err)
                     self._corrupted += 1
                     if self._listener.is_cancelled:
+                        await self._drop_pending()
                         return
-                if not self._listener.is_cancelled and await aiopath.exists(
+                if self._slice:
+                    await self._close_slice()
+                elif not self._listener.is_cancelled and await aiopath.exists(
                     self._up_path
                 ):
                     await remove(self._up_path)
+                    drop_probe(self._up_path)
+        await self._drop_pending()
         for key, value in list(self._media_dict.items()):
             for subkey, msgs in list(value.items()):
                 if len(msgs) > 1:
@@ -424,6 +512,133 @@ class TelegramUploader:
         )
         return
 
+    async def _probe(self, path, file, force_document=False):
+        thumb = self._thumb
+        duration, artist, title = 0, None, None
+        width, height = 480, 320
+        is_video, is_audio, is_image = await get_document_type(path)
+
+        if not is_image and thumb is None:
+            file_name = ospath.splitext(file)[0]
+            thumb_path = f"{self._path}/yt-dlp-thumb/{file_name}.jpg"
+            if await aiopath.isfile(thumb_path):
+                thumb = thumb_path
+            elif is_audio and not is_video:
+                thumb = await get_audio_thumbnail(path)
+
+        if (
+            self._listener.as_doc
+            or force_document
+            or (not is_video and not is_audio and not is_image)
+        ):
+            key = "documents"
+            if is_video and thumb is None:
+                thumb = await get_video_thumbnail(path, None)
+        elif is_video:
+            key = "videos"
+            duration = (await get_media_info(path))[0]
+            if thumb is None and self._listener.thumbnail_layout:
+                thumb = await get_multiple_frames_thumbnail(
+                    path,
+                    self._listener.thumbnail_layout,
+                    self._listener.screen_shots,
+                )
+            if thumb is None:
+                thumb = await get_video_thumbnail(path, duration)
+            if thumb is not None and thumb != "none":
+                with Image.open(thumb) as img:
+                    width, height = img.size
+        elif is_audio:
+            key = "audios"
+            duration, artist, title = await get_media_info(path)
+        else:
+            key = "photos"
+        return key, thumb, duration, artist, title, width, height
+
+    def _prefetch(self, dirpath, files):
+        # Probe and thumbnail the next files while the current one uploads
+        for file_ in files:
+            path = ospath.join(dirpath, file_)
+            if path not in self._probes and path not in self._splits:
+                self._probes[path] = create_task(self._probe(path, file_))
+
+    async def _expand_splits(self, dirpath, files):
+        expanded = []
+        for file_ in files:
+            f_path = ospath.join(dirpath, file_)
+            if (split_size := self._listener.lazy_splits.get(f_path)) is None:
+                expanded.append(file_)
+                continue
+            parts = -(-(await aiopath.getsize(f_path)) // split_size)
+            for index in range(1, parts + 1):
+                part = f"{file_}.{index:03}"
+                self._splits[ospath.join(dirpath, part)] = (
+                    f_path,
+                    index,
+                    parts,
+                    split_size,
+                )
+                expanded.append(part)
+            self._split_left[f_path] = parts
+        return expanded
+
+    def _open_slice(self, part):
+        # Virtual parts are read from the source in place, nothing is cut
+        f_path, index, _, split_size = self._splits.pop(part)
+        self._slice = FileSlice(
+            f_path, (index - 1) * split_size, split_size, ospath.basename(part)
+        )
+
+    async def _close_slice(self):
+        f_path = self._slice.path
+        self._slice.close()
+        self._slice = None
+        self._split_left[f_path] -= 1
+        if not self._split_left[f_path] and not self._listener.is_cancelled:
+            self._listener.lazy_splits.pop(f_path, None)
+            await remove(f_path)
+
+    async def _cut_part(self, part):
+        # Part N+1 is cut from the source while part N uploads
+        f_path, index, parts, split_size = self._splits.pop(part)
+        task = self._cut_tasks.pop(part, None) or create_task(
+            self._splitter.cut(f_path, index, split_size)
+        )
+        if index < parts:
+            self._cut_tasks[f"{f_path}.{index + 1:03}"] = create_task(
+                self._splitter.cut(f_path, index + 1, split_size)
+            )
+        try:
+            await task
+        except Exception as e:
+            LOGGER.error(f"Failed to cut {part}, error: {e}")
+        if index == parts and not self._listener.is_cancelled:
+            self._listener.lazy_splits.pop(f_path, None)
+            await remove(f_path)
+
+    async def _drop_pending(self):
+        for task in self._cut_tasks.values():
+            task.cancel()
+        self._cut_tasks.clear()
+        if self._slice:
+            self._slice.close()
+            self._slice = None
+        for task in self._probes.values():
+            if not task.done():
+                task.cancel()
+                continue
+            if task.cancelled() or task.exception() is not None:
+                continue
+            thumb = task.result()[1]
+            if (
+                self._thumb is None
+                and thumb is not None
+                and thumb != "none"
+                and await aiopath.exists(thumb)
+            ):
+                await remove(thumb)
+        self._probes.clear()
+
     @retry(
         wait=wait_exponential(multiplier=2, min=4, max=8),
         stop=stop_after_attempt(3),
@@ -436,34 +651,33 @@ class TelegramUploader:
             and self._thumb != "none"
         ):
             self._thumb = None
-        thumb = self._thumb
+        thumb = None
         self._is_corrupted = False
         try:
-            is_video, is_audio, is_image = await get_document_type(self._up_path)
-
-            if not is_image and thumb is None:
-                file_name = ospath.splitext(file)[0]
-                thumb_path = f"{self._path}/yt-dlp-thumb/{file_name}.jpg"
-                if await aiopath.isfile(thumb_path):
-                    thumb = thumb_path
-                elif is_audio and not is_video:
-                    thumb = await get_audio_thumbnail(self._up_path)
-
-            if (
-                self._listener.as_doc
-                or force_document
-                or (not is_video and not is_audio and not is_image)
-            ):
-                key = "documents"
-                if is_video and thumb is None:
-                    thumb = await get_video_thumbnail(self._up_path, None)
-
-                if self._listener.is_cancelled:
-                    return
-                if thumb == "none":
-                    thumb = None
-                self._sent_msg = await self._sent_msg.reply_document(
-                    document=self._up_path,
+            if self._slice:
+                key, thumb, duration = "documents", self._thumb, 0
+                artist, title, width, height = None, None, 480, 320
+            else:
+                probe = None if force_document else self._probes.pop(o_path, None)
+                (
+                    key,
+                    thumb,
+                    duration,
+                    artist,
+                    title,
+                    width,
+                    height,
+                ) = await (probe or self._probe(self._up_path, file, force_document))
+            if self._listener.is_cancelled:
+                return
+            if thumb == "none":
+                thumb = None
+
+            if key == "documents":
+                self._sent_msg = await self._hyper_upload(
+                    "document", cap_mono, thumb
+                ) or await self._sent_msg.reply_document(
+                    document=self._slice or self._up_path,
                     quote=True,
                     thumb=thumb,
                     caption=cap_mono,
@@ -471,28 +685,15 @@ class TelegramUploader:
                     disable_notification=True,
                     progress=self._upload_progress,
                 )
-            elif is_video:
-                key = "videos"
-                duration = (await get_media_info(self._up_path))[0]
-                if thumb is None and self._listener.thumbnail_layout:
-                    thumb = await get_multiple_frames_thumbnail(
-                        self._up_path,
-                        self._listener.thumbnail_layout,
-                        self._listener.screen_shots,
-                    )
-                if thumb is None:
-                    thumb = await get_video_thumbnail(self._up_path, duration)
-                if thumb is not None and thumb != "none":
-                    with Image.open(thumb) as img:
-                        width, height = img.size
-                else:
-                    width = 480
-                    height = 320
-                if self._listener.is_cancelled:
-                    return
-                if thumb == "none":
-                    thumb = None
-                self._sent_msg = await self._sent_msg.reply_video(
+            elif key == "videos":
+                self._sent_msg = await self._hyper_upload(
+                    "video",
+                    cap_mono,
+                    thumb,
+                    duration=duration,
+                    width=width,
+                    height=height,
+                ) or await self._sent_msg.reply_video(
                     video=self._up_path,
                     quote=True,
                     caption=cap_mono,
@@ -504,14 +705,15 @@ class TelegramUploader:
                     disable_notification=True,
                     progress=self._upload_progress,
                 )
-            elif is_audio:
-                key = "audios"
-                duration, artist, title = await get_media_info(self._up_path)
-                if self._listener.is_cancelled:
-                    return
-                if thumb == "none":
-                    thumb = None
-                self._sent_msg = await self._sent_msg.reply_audio(
+            elif key == "audios":
+                self._sent_msg = await self._hyper_upload(
+                    "audio",
+                    cap_mono,
+                    thumb,
+                    duration=duration,
+                    performer=artist,
+                    title=title,
+                ) or await self._sent_msg.reply_audio(
                     audio=self._up_path,
                     quote=True,
                     caption=cap_mono,
@@ -523,9 +725,6 @@ class TelegramUploader:
                     progress=self._upload_progress,
                 )
             else:
-                key = "photos"
-                if self._listener.is_cancelled:
-                    return
                 self._sent_msg = await self._sent_msg.reply_photo(
                     photo=self._up_path,
                     quote=True,
@@ -565,6 +764,14 @@ class TelegramUploader:
                 and await aiopath.exists(thumb)
             ):
                 await remove(thumb)
+        except StopTransmission:
+            if (
+                self._thumb is None
+                and thumb is not None
+                and await aiopath.exists(thumb)
+            ):
+                await remove(thumb)
+            self._sent_msg = None
         except (FloodWait, FloodPremiumWait) as f:
             LOGGER.warning(str(f))
             await sleep(f.value * 1.3)
@@ -23,9 +23,15 @@ except ImportError:
 from ... import LOGGER, intervals, status_dict, task_dict_lock
 from ...core.config_manager import Config
 from ...core.tg_client import TgClient
-from ..ext_utils.bot_utils import SetInterval
 from ..ext_utils.exceptions import TgLinkException
-from ..ext_utils.status_utils import get_readable_message
+from ..ext_utils.status_utils import (
+    get_bot_stats,
+    get_readable_message,
+    get_status_page,
+)
+from .status_scheduler import StatusScheduler
+
+STATUS_MAX_AGE = 60
 
 
 async def send_message(message, text, buttons=None, block=True, photo=None, **kwargs):
@@ -34,7 +40,9 @@ async def send_message(message, text, buttons=None, block=True, photo=None, **kw
             if message.lstrip("-").isdigit():
                 message = int(message)
             else:
-                LOGGER.error(f"send_message called with str instead of Message: {message}")
+                LOGGER.error(
+                    f"send_message called with str instead of Message: {message}"
+                )
                 return
         if photo:
             try:
@@ -85,7 +93,9 @@ async def send_message(message, text, buttons=None, block=True, photo=None, **kw
                 reply_markup=buttons,
             )
         if not isinstance(message, Message):
-            LOGGER.error(f"send_message: message is not a Message or int: {type(message)}")
+            LOGGER.error(
+                f"send_message: message is not a Message or int: {type(message)}"
+            )
             return
         return await message.reply(
             text=text,
@@ -126,7 +136,7 @@ async def edit_message(message, text, buttons=None, block=True):
     except FloodWait as f:
         LOGGER.warning(str(f))
         if not block:
-            return str(f)
+            raise
         await sleep(f.value * 1.2)
         return await edit_message(message, text, buttons)
     except Exception as e:
@@ -292,6 +302,16 @@ async def get_tg_link_message(link):
 
 
 async def update_status_message(sid, force=False):
+    if not force and (obj := intervals["status"].get(sid)):
+        obj.request()
+        return
+    # Scheduled chats are paced by StatusScheduler, this only guards the rest
+    if not force and time() - (status_dict.get(sid) or {}).get("time", 0) < 3:
+        return
+    await refresh_status_message(sid, force)
+
+
+async def refresh_status_message(sid, force=False):
     if intervals["stopAll"]:
         return
     async with task_dict_lock:
@@ -300,26 +320,34 @@ async def update_status_message(sid, force=False):
                 obj.cancel()
                 del intervals["status"][sid]
             return
-        if not force and time() - status_dict[sid]["time"] < 3:
+        if time() < status_dict[sid].get("flood_until", 0):
             return
         status_dict[sid]["time"] = time()
         page_no = status_dict[sid]["page_no"]
         status = status_dict[sid]["status"]
         is_user = status_dict[sid]["is_user"]
         page_step = status_dict[sid]["page_step"]
-        text, buttons = await get_readable_message(
-            sid, is_user, page_no, status, page_step
-        )
+        text, buttons = await get_status_page(sid, is_user, page_no, status, page_step)
         if text is None:
             del status_dict[sid]
             if obj := intervals["status"].get(sid):
                 obj.cancel()
                 del intervals["status"][sid]
             return
-        if text != status_dict[sid]["message"].text:
-            message = await edit_message(
-                status_dict[sid]["message"], text, buttons, block=False
-            )
+        page_hash = hash(text)
+        if (
+            force
+            or page_hash != status_dict[sid].get("hash")
+            or time() - status_dict[sid].get("edited", 0) >= STATUS_MAX_AGE
+        ):
+            text += get_bot_stats()
+            try:
+                message = await edit_message(
+                    status_dict[sid]["message"], text, buttons, block=False
+                )
+            except FloodWait as f:
+                status_dict[sid]["flood_until"] = time() + f.value * 1.2
+                return
             if isinstance(message, str):
                 if message.startswith("Telegram says: [40"):
                     del status_dict[sid]
@@ -332,7 +360,8 @@ async def update_status_message(sid, force=False):
                     )
                 return
             status_dict[sid]["message"].text = text
-            status_dict[sid]["time"] = time()
+            status_dict[sid]["hash"] = page_hash
+            status_dict[sid]["edited"] = status_dict[sid]["time"] = time()
 
 
 async def send_status_message(msg, user_id=0):
@@ -384,6 +413,4 @@ async def send_status_message(msg, user_id=0):
                 "is_user": is_user,
             }
         if not intervals["status"].get(sid) and not is_user:
-            intervals["status"][sid] = SetInterval(
-                Config.STATUS_UPDATE_INTERVAL, update_status_message, sid
-            )
+            intervals["status"][sid] = StatusScheduler.add(sid, refresh_status_message)
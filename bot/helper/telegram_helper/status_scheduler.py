@@ -0,0 +1,120 @@
+from asyncio import gather, sleep
+from time import time
+
+from ... import LOGGER, bot_loop, intervals, status_dict
+from ...core.config_manager import Config
+
+
+class StatusInterval:
+    def __init__(self, sid, action):
+        self.sid = sid
+        self.action = action
+        self.interval = StatusScheduler.base_interval()
+        self.due = time() + self.interval
+        self.flood_until = 0
+        # Groups allow about 20 messages a minute, private chats one a second
+        self.rate = (
+            StatusScheduler.GROUP_RATE if sid < 0 else StatusScheduler.PRIVATE_RATE
+        )
+        self.tokens = StatusScheduler.CHAT_BURST
+        self.refilled = time()
+
+    def refill(self, now):
+        self.tokens = min(
+            StatusScheduler.CHAT_BURST,
+            self.tokens + (now - self.refilled) * self.rate,
+        )
+        self.refilled = now
+
+    def request(self):
+        self.due = min(self.due, max(time(), self.flood_until))
+
+    def cancel(self):
+        StatusScheduler.remove(self)
+
+
+class StatusScheduler:
+    # One loop drives every status chat against a global edit budget
+    TICK = 1
+    MIN_INTERVAL = 3
+    MAX_FACTOR = 4
+    GLOBAL_RATE = 20
+    GROUP_RATE = 20 / 60
+    PRIVATE_RATE = 1
+    CHAT_BURST = 3
+
+    chats = {}
+    _tokens = GLOBAL_RATE
+    _refilled = 0
+    _task = None
+
+    @classmethod
+    def base_interval(cls):
+        return max(Config.STATUS_UPDATE_INTERVAL, cls.MIN_INTERVAL)
+
+    @classmethod
+    def add(cls, sid, action):
+        chat = cls.chats[sid] = StatusInterval(sid, action)
+        if cls._task is None or cls._task.done():
+            cls._task = bot_loop.create_task(cls._run())
+        return chat
+
+    @classmethod
+    def remove(cls, chat):
+        if cls.chats.get(chat.sid) is chat:
+            del cls.chats[chat.sid]
+
+    @classmethod
+    def reset(cls, interval):
+        interval = max(interval, cls.MIN_INTERVAL)
+        for chat in cls.chats.values():
+            chat.interval = interval
+            chat.due = max(time() + interval, chat.flood_until)
+
+    @classmethod
+    def _refill(cls, now):
+        cls._tokens = min(
+            cls.GLOBAL_RATE, cls._tokens + (now - cls._refilled) * cls.GLOBAL_RATE
+        )
+        cls._refilled = now
+
+    @classmethod
+    async def _fire(cls, chat):
+        edited = status_dict.get(chat.sid, {}).get("edited", 0)
+        try:
+            await chat.action(chat.sid)
+        except Exception as e:
+            LOGGER.error(f"Status with id: {chat.sid} haven't been updated. {e}")
+        now = time()
+        base = cls.base_interval()
+        state = status_dict.get(chat.sid) or {}
+        if state.get("flood_until", 0) > now:
+            chat.flood_until = state["flood_until"]
+            chat.interval = min(chat.interval * 2, base * cls.MAX_FACTOR)
+        elif state.get("edited", 0) > edited:
+            chat.interval = max(chat.interval / 1.5, cls.MIN_INTERVAL, base / 3)
+        else:
+            chat.interval = min(chat.interval * 1.5, base * cls.MAX_FACTOR)
+        chat.due = max(now + chat.interval, chat.flood_until)
+
+    @classmethod
+    async def _run(cls):
+        while cls.chats and not intervals["stopAll"]:
+            now = time()
+            cls._refill(now)
+            for chat in cls.chats.values():
+                chat.refill(now)
+            due = sorted(
+                (
+                    chat
+                    for chat in cls.chats.values()
+                    if chat.due <= now and chat.flood_until <= now and chat.tokens >= 1
+                ),
+                key=lambda chat: chat.due,
+            )
+            if batch := due[: int(cls._tokens)]:
+                cls._tokens -= len(batch)
+                for chat in batch:
+                    chat.tokens -= 1
+                await gather(*(cls._fire(chat) for chat in batch))
+            await sleep(cls.TICK)
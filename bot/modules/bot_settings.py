@@ -33,10 +33,7 @@ from .. import (
     auth_chats,
     sudo_users,
 )
-from ..helper.ext_utils.bot_utils import (
-    SetInterval,
-    new_task,
-)
+from ..helper.ext_utils.bot_utils import new_task
 from ..core.config_manager import Config
 from ..core.tg_client import TgClient
 from ..core.torrent_manager import TorrentManager
@@ -51,8 +48,8 @@ from ..helper.telegram_helper.message_utils import (
     edit_message,
     send_file,
     send_message,
-    update_status_message,
 )
+from ..helper.telegram_helper.status_scheduler import StatusScheduler
 from .rss import add_job
 from .search import initiate_search_tools
 
@@ -61,6 +58,9 @@ state = "view"
 handler_dict = {}
 DEFAULT_VALUES = {
     "LEECH_SPLIT_SIZE": TgClient.MAX_SPLIT_SIZE,
+    "LEECH_PREFETCH": 2,
+    "DIRECT_PARALLEL": 4,
+    "HYPER_SESSIONS": 4,
     "RSS_DELAY": 600,
     "STATUS_UPDATE_INTERVAL": 15,
     "SEARCH_LIMIT": 0,
@@ -278,12 +278,8 @@ async def edit_variable(_, message, pre_message, key):
             await database.trunc_table("tasks")
     elif key == "STATUS_UPDATE_INTERVAL":
         value = int(value)
-        if len(task_dict) != 0 and (st := intervals["status"]):
-            for cid, intvl in list(st.items()):
-                intvl.cancel()
-                intervals["status"][cid] = SetInterval(
-                    value, update_status_message, cid
-                )
+        if len(task_dict) != 0 and intervals["status"]:
+            StatusScheduler.reset(value)
     elif key == "TORRENT_TIMEOUT":
         await TorrentManager.change_aria2_option("bt-stop-timeout", value)
         value = int(value)
@@ -653,13 +649,9 @@ async def edit_bot_settings(client, query):
             if (
                 data[2] == "STATUS_UPDATE_INTERVAL"
                 and len(task_dict) != 0
-                and (st := intervals["status"])
+                and intervals["status"]
             ):
-                for key, intvl in list(st.items()):
-                    intvl.cancel()
-                    intervals["status"][key] = SetInterval(
-                        value, update_status_message, key
-                    )
+                StatusScheduler.reset(value)
         elif data[2] == "EXCLUDED_EXTENSIONS":
             excluded_extensions.clear()
             excluded_extensions.extend(["aria2", "!qB"])
@@ -931,12 +923,8 @@ async def load_config():
     if not await aiopath.exists("accounts"):
         Config.USE_SERVICE_ACCOUNTS = False
 
-    if len(task_dict) != 0 and (st := intervals["status"]):
-        for key, intvl in list(st.items()):
-            intvl.cancel()
-            intervals["status"][key] = SetInterval(
-                Config.STATUS_UPDATE_INTERVAL, update_status_message, key
-            )
+    if len(task_dict) != 0 and intervals["status"]:
+        StatusScheduler.reset(Config.STATUS_UPDATE_INTERVAL)
 
     if Config.TORRENT_TIMEOUT:
         await TorrentManager.change_aria2_option(
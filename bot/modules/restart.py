@@ -132,6 +132,8 @@ async def confirm_restart(_, query):
             jd.cancel()
         if nzb := intervals["nzb"]:
             nzb.cancel()
+        if snapshot := intervals["snapshot"]:
+            snapshot.cancel()
         if st := intervals["status"]:
             for intvl in list(st.values()):
                 intvl.cancel()
@@ -160,7 +162,7 @@ async def confirm_restart(_, query):
             "pkill",
             "-9",
             "-f",
-            f"gunicorn|{BinConfig.ARIA2_NAME}|{BinConfig.QBIT_NAME}|{BinConfig.FFMPEG_NAME}|{BinConfig.RCLONE_NAME}|java|{BinConfig.SABNZBD_NAME}|7z|split",
+            f"gunicorn|{BinConfig.ARIA2_NAME}|{BinConfig.QBIT_NAME}|{BinConfig.FFMPEG_NAME}|{BinConfig.RCLONE_NAME}|java|{BinConfig.SABNZBD_NAME}|7z",
         )
         proc2 = await create_subprocess_exec("python3", "update.py")
         await gather(proc1.wait(), proc2.wait())
@@ -152,11 +152,14 @@ UPDATE_PKGS = True
 
 # Leech
 LEECH_SPLIT_SIZE = 0
+LEECH_PREFETCH = 2
+LEECH_VIRTUAL_SPLIT = True
 AS_DOCUMENT = True
 EQUAL_SPLITS = False
 MEDIA_GROUP = False
 USER_TRANSMISSION = True
 HYBRID_LEECH = True
+HYPER_SESSIONS = 4
 LEECH_PREFIX = ""
 LEECH_SUFFIX = ""
 LEECH_FONT = ""
@@ -178,6 +181,9 @@ WEB_PINCODE = True
 QUEUE_ALL = 0
 QUEUE_DOWNLOAD = 0
 QUEUE_UPLOAD = 0
+QUEUE_POLICY = "fair"
+QUEUE_ADAPTIVE = False
+DIRECT_PARALLEL = 4
 
 # RSS
 RSS_DELAY = 600
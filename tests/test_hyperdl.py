@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+
+import pytest
+from pyrogram import raw
+from pyrogram.errors import FloodWait
+
+from bot import bot_loop
+from bot.core.tg_client import TgClient
+from bot.helper.ext_utils.hyperdl_utils import (
+    ChunkScheduler,
+    HyperTGDownload,
+    RangeJournal,
+)
+
+CHUNK = 1024 * 1024
+DATA = bytes(range(256)) * (6 * CHUNK // 256 - 100)
+
+
+class FakeSession:
+    def __init__(self, flood_after=None):
+        self.flood_after = flood_after
+        self.offsets = []
+
+    async def invoke(self, query):
+        if self.flood_after is not None and len(self.offsets) >= self.flood_after:
+            raise FloodWait(value=120)
+        self.offsets.append(query.offset)
+        return raw.types.upload.File(
+            type=raw.types.storage.FilePartial(),
+            mtime=0,
+            bytes=DATA[query.offset : query.offset + query.limit],
+        )
+
+
+@pytest.fixture
+def helpers(monkeypatch, tmp_path):
+    sessions = []
+
+    async def get_media_session(client, dc_id, slot=0, max_retries=3):
+        return sessions[-1]
+
+    async def get_file_id(self, client, index):
+        return SimpleNamespace(dc_id=2)
+
+    async def get_location(file_id):
+        return None
+
+    monkeypatch.setattr(TgClient, "helper_bots", {0: object(), 1: object()})
+    monkeypatch.setattr(TgClient, "helper_loads", {0: 0, 1: 0})
+    monkeypatch.setattr(TgClient, "get_media_session", get_media_session)
+    monkeypatch.setattr(TgClient, "release_media_session", lambda *_: None)
+    monkeypatch.setattr(HyperTGDownload, "get_file_id", get_file_id)
+    monkeypatch.setattr(HyperTGDownload, "get_location", staticmethod(get_location))
+    monkeypatch.setattr(HyperTGDownload, "PARTIAL_DIR", str(tmp_path / "partial"))
+    return sessions
+
+
+def downloader(directory):
+    hyper = HyperTGDownload()
+    hyper.directory = str(directory)
+    hyper.file_name = "file.bin"
+    hyper.file_size = len(DATA)
+    hyper._file_key = "AgADunique"
+    return hyper
+
+
+def test_interrupted_download_resumes_in_a_new_task(helpers, tmp_path):
+    chunks = {index * CHUNK for index in range(6)}
+
+    helpers.append(FakeSession(flood_after=3))
+    with pytest.raises(FloodWait):
+        bot_loop.run_until_complete(
+            downloader(tmp_path / "1").handle_download(None, ())
+        )
+    fetched = set(helpers[-1].offsets)
+    assert len(fetched) == 3
+    partial = tmp_path / "partial" / "AgADunique.temp"
+    assert partial.exists()
+
+    journal = RangeJournal(f"{partial}.journal", "AgADunique", len(DATA), CHUNK)
+    assert len(journal.open(True).missing()) == 3
+    journal.close()
+
+    helpers.append(FakeSession())
+    path = bot_loop.run_until_complete(
+        downloader(tmp_path / "2").handle_download(None, ())
+    )
+    assert path == str(tmp_path / "2" / "file.bin")
+    assert set(helpers[-1].offsets) == chunks - fetched
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+    assert not list((tmp_path / "partial").iterdir())
+
+
+def test_flood_wait_reaches_caller_only_when_all_bots_wait_long():
+    scheduler = ChunkScheduler([0, 1], [0, 1])
+    scheduler.park(0, FloodWait(value=300))
+    assert scheduler.error is None
+    scheduler.park(1, FloodWait(value=10))
+    assert scheduler.error is None
+
+    scheduler = ChunkScheduler([0, 1], [0, 1])
+    scheduler.park(0, FloodWait(value=300))
+    scheduler.park(1, FloodWait(value=90))
+    assert scheduler.error.value == 90
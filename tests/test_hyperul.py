@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import pytest
+from pyrogram import raw
+
+from bot import bot_loop
+from bot.core.config_manager import Config
+from bot.core.tg_client import TgClient
+from bot.helper.ext_utils.files_utils import FileSlice
+from bot.helper.ext_utils.hyperul_utils import HyperTGUpload
+
+PART = HyperTGUpload.PART_SIZE
+DATA = bytes(range(256)) * (3 * PART // 256) + b"x" * 100
+
+
+class FakeSession:
+    def __init__(self, slot, saved):
+        self.slot = slot
+        self.saved = saved
+
+    async def invoke(self, query):
+        self.saved.append((self.slot, query))
+        return True
+
+
+class FakeClient:
+    name = "bot"
+
+    def __init__(self):
+        async def dc_id():
+            return 2
+
+        self.storage = SimpleNamespace(dc_id=dc_id)
+
+    def rnd_id(self):
+        return 42
+
+
+@pytest.fixture
+def uploader(monkeypatch):
+    saved = []
+
+    async def get_media_session(client, dc_id, slot=0, max_retries=3):
+        return FakeSession(slot, saved)
+
+    monkeypatch.setattr(TgClient, "get_media_session", get_media_session)
+    monkeypatch.setattr(TgClient, "release_media_session", lambda *_: None)
+    monkeypatch.setattr(Config, "HYPER_THREADS", 6)
+    monkeypatch.setattr(Config, "HYPER_SESSIONS", 2)
+    hyper = HyperTGUpload(FakeClient(), SimpleNamespace(is_cancelled=False))
+    return hyper, saved
+
+
+def test_only_files_above_min_size_use_hyper_upload():
+    assert not HyperTGUpload.supports(HyperTGUpload.MIN_SIZE)
+    assert HyperTGUpload.supports(HyperTGUpload.MIN_SIZE + 1)
+
+
+def test_file_is_saved_as_big_file_in_parts(uploader, tmp_path):
+    hyper, saved = uploader
+    path = tmp_path / "file.bin"
+    path.write_bytes(DATA)
+
+    file = bot_loop.run_until_complete(hyper.save_file(str(path)))
+
+    assert isinstance(file, raw.types.InputFileBig)
+    assert (file.id, file.parts, file.name) == (42, 4, "file.bin")
+    parts = {query.file_part: query for _, query in saved}
+    assert sorted(parts) == [0, 1, 2, 3]
+    assert all(query.file_total_parts == 4 for query in parts.values())
+    assert b"".join(parts[index].bytes for index in range(4)) == DATA
+    assert {slot for slot, _ in saved} <= {0, 1}
+
+
+def test_virtual_part_is_saved_from_its_window(uploader, tmp_path):
+    hyper, saved = uploader
+    path = tmp_path / "file.bin"
+    path.write_bytes(DATA)
+    part = FileSlice(str(path), PART, 2 * PART, "file.bin.002")
+
+    file = bot_loop.run_until_complete(hyper.save_file(part))
+    part.close()
+
+    assert (file.parts, file.name) == (2, "file.bin.002")
+    parts = {query.file_part: query.bytes for _, query in saved}
+    assert parts[0] + parts[1] == DATA[PART : 3 * PART]
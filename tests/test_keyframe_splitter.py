@@ -0,0 +1,22 @@
+from bot.helper.ext_utils.media_utils import KeyframeSplitter, MediaProbe
+
+
+def packets(first):
+    # One video packet a second with a keyframe every two seconds
+    return b"".join(
+        f"0,{pts:.6f},{pts:.6f},100,{'K_' if pts % 2 == 0 else '__'}\n".encode()
+        for pts in range(first, first + 6)
+    )
+
+
+def test_cuts_are_relative_to_the_container_start_time():
+    probe = MediaProbe({"format": {"start_time": "10.000000"}, "streams": []})
+    splitter = KeyframeSplitter(0, 250, probe.start_time)
+    splitter.feed(packets(10))
+    assert splitter.finish() == [2.0, 4.0]
+
+
+def test_source_starting_at_zero_keeps_raw_keyframe_times():
+    splitter = KeyframeSplitter(0, 250)
+    splitter.feed(packets(0))
+    assert splitter.finish() == [2.0, 4.0]